@@ -0,0 +1,61 @@
+""" Benchmark grouping OCR character areas into lines
+
+Times parse.guessformat on synthetic text-heavy pages of growing size,
+against the previous version if given as a path to an old parse.py.
+
+Usage: python benchmarks/guessformat.py [old_parse.py]
+"""
+
+from __future__ import print_function
+from __future__ import division
+import importlib.util
+import random
+import os
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Run from a checkout without installing meme_get
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from meme_get.ocr import parse
+
+
+def page(lines, chars, rng):
+    """ Random character areas and scores laid out in lines
+    """
+    bds = []
+    for j in range(lines):
+        x = 0
+        for i in range(chars):
+            w = rng.randint(20, 40)
+            y = 20 + 60 * j + rng.randint(-2, 2)
+            bds.append([x, y, x + w, y + rng.choice([10, 45, 50])])
+            x += w + rng.choice([2, 4, 30])
+    rng.shuffle(bds)
+    ccr = [[["A", 1.0], ["B", 0.5]] for _ in bds]
+    return bds, ccr
+
+
+def main():
+    old = None
+    if len(sys.argv) > 1:
+        spec = importlib.util.spec_from_file_location("old_parse", sys.argv[1])
+        old = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(old)
+
+    rng = random.Random(0)
+    for lines, chars in [(4, 25), (10, 50), (20, 100), (40, 200)]:
+        bds, ccr = page(lines, chars, rng)
+        t = min(timeit.repeat(lambda: parse.guessformat(bds, ccr),
+                              number=1, repeat=3))
+        line = "{:5d} areas: {:.4f}s".format(len(bds), t)
+        if old is not None:
+            t_old = min(timeit.repeat(lambda: old.guessformat(bds, ccr),
+                                      number=1, repeat=1))
+            line += "  old: {:.4f}s".format(t_old)
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+""" Benchmark the start-up cost of meme_get
+
+Runs "python -X importtime -c 'import <module>'" in fresh interpreters and
+reports the total import time and the slowest imported modules.
+
+Usage: python benchmarks/importtime.py [module] [runs]
+"""
+
+from __future__ import print_function
+from __future__ import division
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, os.pardir)
+
+
+def importtime(module):
+    """ Import a module in a new interpreter
+
+    :return: A dict of cumulative import times in microseconds by module
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [ROOT] + [p for p in [env.get("PYTHONPATH")] if p])
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                          "import " + module],
+                         stderr=subprocess.PIPE, env=env, check=True,
+                         universal_newlines=True).stderr
+    times = {}
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[1].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        times[name] = max(times.get(name, 0), int(fields[1]))
+    return times
+
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else "meme_get.memesites"
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    results = [importtime(module) for _ in range(runs)]
+    best = min(results, key=lambda t: t[module])
+    print("import {:s}: {:.1f} ms (best of {:d})".format(
+        module, best[module] / 1000, runs))
+    top = [(t, m) for m, t in best.items()
+           if m != module and "." not in m]
+    for t, m in sorted(top, reverse=True)[:10]:
+        print("  {:8.1f} ms  {:s}".format(t / 1000, m))
+
+
+if __name__ == '__main__':
+    main()
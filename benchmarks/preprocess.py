@@ -0,0 +1,93 @@
+""" Benchmark preprocessing before OCR
+
+Runs FontMatching and Tesseract OCR on the sample images, scaled up to
+the sizes of large Reddit pictures, with and without the scale-down and
+caption crop of meme_get.ocr.preprocess. Accuracy is the similarity of
+the caption to the caption the same engine finds on the original sample
+without preprocessing, and the share of its words found in the
+dictionary, 0 for an empty caption. Fragments such as "E ES" are
+dictionary words, so similarity is the measure to go by. Tesseract rows
+are skipped when Tesseract is not installed.
+
+Usage: python benchmarks/preprocess.py [image ...]
+"""
+
+from __future__ import print_function
+from __future__ import division
+import difflib
+import glob
+import io
+import os
+import sys
+import time
+from PIL import Image
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Run from a checkout without installing meme_get
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from meme_get.ocr import memeocr, ocrcomp, preprocess
+
+SAMPLES = os.path.join(HERE, os.pardir, "docs", "source", "images", "*.jpg")
+
+SETTINGS = [("none", None),
+            ("bands", preprocess.Preprocess(detect=False, min_height=0)),
+            ("detect", preprocess.Preprocess(min_height=0)),
+            ("detect, no crop", preprocess.Preprocess(crop=False,
+                                                      min_height=0)),
+            ("default", preprocess.DEFAULT)]
+
+
+def encode(image, factor):
+    """ The picture scaled up by a factor, as JPEG bytes
+    """
+    w, h = image.size
+    if factor != 1:
+        image = image.resize((w * factor, h * factor), Image.BICUBIC)
+    data = io.BytesIO()
+    image.save(data, "JPEG", quality=90)
+    return data.getvalue()
+
+
+def words(caption):
+    """ The share of the words of a caption found in the dictionary
+    """
+    if caption.strip() == "":
+        return 0.0
+    return ocrcomp.evalresult(caption)
+
+
+def main():
+    paths = sys.argv[1:] or sorted(glob.glob(SAMPLES))
+    engines = dict((name, memeocr.OcrEngine(preprocess=p))
+                   for name, p in SETTINGS)
+    methods = [("FontMatching", lambda e, x: e.ocr(x)),
+               ("Tesseract", lambda e, x: e.tesseract(
+                   x, thres=True, spellcheck=False))]
+
+    for method, run in methods:
+        try:
+            run(engines["none"], paths[0])
+        except (ImportError, RuntimeError) as e:
+            print("{:s}: skipped, {!s}".format(method, e))
+            continue
+        for path in paths:
+            image = Image.open(path).convert("RGB")
+            reference = run(engines["none"], path)
+            print("{:s} {:s}: {!r}".format(method, os.path.basename(path),
+                                           reference))
+            for factor in [1, 2, 4]:
+                data = encode(image, factor)
+                for name, _ in SETTINGS:
+                    start = time.time()
+                    caption = run(engines[name], io.BytesIO(data))
+                    seconds = time.time() - start
+                    similarity = difflib.SequenceMatcher(
+                        None, reference, caption).ratio()
+                    print("  x{:d} {:16s} {:6.2f}s  similarity {:.2f}  "
+                          "words {:.2f}".format(factor, name, seconds,
+                                                similarity, words(caption)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+""" Benchmark parsing quickmeme.com pages
+
+Parses saved quickmeme.com pages with every HTML backend in
+meme_get.parsers that is installed, checks that they all find the same
+memes, and reports the pages parsed per second. The pages default to the
+fixture page of the test suite.
+
+Usage: python benchmarks/quickmeme_parse.py [rounds] [page.html ...]
+"""
+
+from __future__ import print_function
+from __future__ import division
+import io
+import os
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Run from a checkout without installing meme_get
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from meme_get import parsers
+
+FIXTURE = os.path.join(HERE, os.pardir, "tests", "quickmeme_page.html")
+
+
+def summary(memes):
+    return [(m.get_pic_url(), m.get_caption(), m.get_tags()) for m in memes]
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    paths = sys.argv[2:] or [FIXTURE]
+    pages = []
+    for path in paths:
+        with io.open(path, encoding="utf-8") as f:
+            pages.append(f.read())
+
+    reference = None
+    print("{:d} pages, {:d} rounds".format(len(pages), rounds))
+    for parser in parsers.QUICKMEME_PARSERS:
+        try:
+            result = [summary(parsers.quickmeme(p, parser=parser))
+                      for p in pages]
+        except ImportError as err:
+            print("{:12s} not installed ({})".format(parser, err))
+            continue
+        if reference is None:
+            reference = result
+        assert result == reference, parser
+
+        t = min(timeit.repeat(
+            lambda: [parsers.quickmeme(p, parser=parser) for p in pages],
+            number=rounds, repeat=3))
+        print("{:12s} {:8.1f} pages/s".format(
+            parser, rounds * len(pages) / t))
+    print("default: {}".format(parsers.default_parser()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+""" Benchmark the OCR thresholding stage
+
+Compares the old per-pixel threshold (rgb2hsv and one draw call per pixel)
+with the array version in meme_get.ocr.threshold on the sample images.
+
+Usage: python benchmarks/threshold.py [image ...]
+"""
+
+from __future__ import print_function
+from __future__ import division
+import glob
+import os
+import sys
+import timeit
+import numpy as np
+from PIL import Image, ImageDraw
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Run from a checkout without installing meme_get
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from meme_get.ocr.threshold import threshold
+
+SAMPLES = os.path.join(HERE, os.pardir, "docs", "source", "images", "*.jpg")
+
+
+def rgb2hsv(r, g, b):
+    R = r / 255.0
+    G = g / 255.0
+    B = b / 255.0
+    cmax = max(R, G, B)
+    cmin = min(R, G, B)
+    delta = cmax - cmin
+    if cmax == 0:
+        S = 0
+    else:
+        S = delta / cmax
+    return 0, S, cmax
+
+
+def perpixel(im):
+    """ The threshold loop memeocr.thresh() used before
+    """
+    w, h = im.size
+    px = im.load()
+    thim = Image.new("RGB", (w, h))
+    thdr = ImageDraw.Draw(thim)
+    for x in range(0, w):
+        for y in range(0, h):
+            r, g, b = px[x, y][:3]
+            hsv = rgb2hsv(r, g, b)
+            if hsv[2] > 0.9 and hsv[1] < 0.1:
+                thdr.point([x, y], fill=(255, 255, 255))
+            else:
+                thdr.point([x, y], fill=(0, 0, 0))
+    return thim
+
+
+def best(f, repeat):
+    return min(timeit.repeat(f, number=1, repeat=repeat))
+
+
+def main(paths):
+    print("{:<16} {:>10} {:>12} {:>12} {:>8} {:>6}".format(
+        "image", "pixels", "perpixel(s)", "array(s)", "speedup", "same"))
+    for path in paths:
+        im = Image.open(path).convert("RGB")
+        old = perpixel(im)
+        new = threshold(im)
+        same = np.array_equal(np.asarray(old)[:, :, 0], np.asarray(new))
+
+        t_old = best(lambda: perpixel(im), 1)
+        t_new = best(lambda: threshold(im), 5)
+        print("{:<16} {:>10d} {:>12.4f} {:>12.4f} {:>7.0f}x {:>6}".format(
+            os.path.basename(path), im.size[0] * im.size[1],
+            t_old, t_new, t_old / t_new, str(same)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or sorted(glob.glob(SAMPLES)))
@@ -0,0 +1,51 @@
+""" Benchmark word list lookups
+
+Compares membership tests against the old list of words with the shared
+set-backed word list in meme_get.ocr.wordlist, using a mix of words and
+OCR-like misspellings.
+
+Usage: python benchmarks/wordlist.py [lookups]
+"""
+
+from __future__ import print_function
+from __future__ import division
+import random
+import os
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Run from a checkout without installing meme_get
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from meme_get.ocr import wordlist
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with open(wordlist.WL_PATH, "r") as f:
+        old = f.read().upper().split("\n")
+    new = wordlist.load()
+
+    rng = random.Random(0)
+    queries = []
+    for _ in range(n):
+        w = rng.choice(old)
+        if w and rng.random() < 0.5:
+            i = rng.randrange(len(w))
+            w = w[:i] + rng.choice("IL1O0") + w[i + 1:]
+        queries.append(w)
+
+    assert [q in old for q in queries] == [q in new for q in queries]
+
+    t_old = min(timeit.repeat(lambda: [q in old for q in queries],
+                              number=1, repeat=3))
+    t_new = min(timeit.repeat(lambda: [q in new for q in queries],
+                              number=1, repeat=3))
+    print("{:d} lookups in {:d} words".format(n, len(old)))
+    print("list: {:.4f}s  set: {:.6f}s  ({:.0f}x)".format(
+        t_old, t_new, t_old / t_new))
+
+
+if __name__ == '__main__':
+    main()
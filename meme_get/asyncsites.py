@@ -0,0 +1,236 @@
+""" Asyncio Meme Sites Module
+
+Counterparts of the meme sites for programs running on an asyncio event
+loop. Pages are requested with aiohttp, which is an optional dependency
+(``pip install meme_get[async]``), and parsed by :mod:`meme_get.parsers`
+like the blocking sites. All the pages of a site, and any number of
+sites, can be fetched concurrently on one event loop::
+
+    >>> from meme_get.asyncsites import AsyncQuickMeme, AsyncMemeGenerator
+    >>> async def main():
+    >>>     async with AsyncQuickMeme() as qm, AsyncMemeGenerator() as mg:
+    >>>         return await asyncio.gather(qm.get_memes(50),
+    >>>                                     mg.get_memes(50))
+
+These sites do no I/O until get_memes is awaited, and they do not use
+the site cache. This module needs Python 3.5 or later.
+"""
+
+import asyncio
+import json
+import math
+import sys
+from . import download
+from . import parsers
+
+
+class AsyncRateLimiter(object):
+    """ Space out the requests sent to each host from an event loop
+
+    The slots are booked on a :class:`meme_get.download.RateLimiter`, by
+    default the one of the blocking downloads, so that the blocking and
+    asyncio sites of a program share one rate limit per host.
+
+    **Attributes:**
+        * _limiter (RateLimiter): The limiter whose schedule is followed
+    """
+
+    def __init__(self, limiter=None):
+        self._limiter = limiter if limiter is not None else \
+            download._limiter
+
+    async def wait(self, url):
+        """ Wait until a request to the host of a url may be sent
+
+        :param str url: The url about to be requested
+        """
+        delay = self._limiter.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+_limiter = AsyncRateLimiter()
+
+
+class AsyncMemeSite(object):
+    """ A super class for meme sites read from an asyncio event loop
+
+    This class should be subclassed.
+
+    **Attributes:**
+        * _url (str): URL for the website hosting memes
+        * _posts_per_page (int): Number of memes on a page of the site
+        * _workers (int): Max number of pages requested at once
+        * _max_tries (int): Max tries for http requests
+        * _timeout (float): Timeout of a request in seconds
+        * _session (aiohttp.ClientSession): The HTTP session, made on
+          first use unless one is given
+        * _limiter (AsyncRateLimiter): The rate limit of the requests
+    """
+
+    def __init__(self, url, session=None, workers=8, max_tries=3,
+                 timeout=download.TIMEOUT, limiter=None):
+        self._url = url
+        self._posts_per_page = 10
+        self._workers = workers
+        self._max_tries = max_tries
+        self._timeout = timeout
+        self._session = session
+        self._own_session = session is None
+        self._limiter = limiter if limiter is not None else _limiter
+
+    async def get_memes(self, num_memes):
+        """ Return a list of Memes.
+
+        The pages holding them are requested concurrently, by up to
+        _workers at once. If one page fails, the others are cancelled
+        before the error is raised.
+
+        :param int num_memes: Number of memes, from the most popular on
+        :return: A list of Meme objects.
+        :rtype: list
+        """
+        max_page = int(math.ceil(num_memes / self._posts_per_page))
+        semaphore = asyncio.Semaphore(self._workers)
+
+        async def page(page_num):
+            async with semaphore:
+                return await self._get_memes_helper(page_num)
+
+        tasks = [asyncio.ensure_future(page(i))
+                 for i in range(1, max_page + 1)]
+        try:
+            pages = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            # Let them end before the session can be closed under them
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return [meme for memes in pages for meme in memes][:num_memes]
+
+    async def get_captions(self, num_memes):
+        """ Return a list of captions.
+
+        :return: A list of strings representing the captions.
+            If captions do not exist, the string will be of None type.
+        :rtype: list
+        """
+        memes = await self.get_memes(num_memes)
+        return [x.get_caption() for x in memes]
+
+    def get_url(self):
+        """ Return the base url
+
+        :rtype: str
+        """
+        return self._url
+
+    async def close(self):
+        """ Close the HTTP session, unless it was given to the site
+        """
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _get_memes_helper(self, page_num):
+        """ Return a list of the memes on a page of the site
+        """
+        raise NotImplementedError("Implement in subclasses.")
+
+    def _get_session(self):
+        """ Return the HTTP session, making it on first use
+        """
+        if self._session is None:
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit_per_host=download.POOL_SIZE),
+                timeout=aiohttp.ClientTimeout(total=self._timeout))
+        return self._session
+
+    async def _get_page(self, url, params=None):
+        """ Request a web page, retrying transient failures
+
+        Retries work like :func:`meme_get.download.get_page`.
+
+        :return: The body of the response
+        :rtype: str
+        :raises aiohttp.ClientError: if the last try fails
+        """
+        import aiohttp
+        session = self._get_session()
+        for attempt in range(max(1, self._max_tries)):
+            if attempt > 0:
+                await asyncio.sleep(min(download.MAX_BACKOFF,
+                                        download.BACKOFF * 2 ** (attempt - 1)))
+            await self._limiter.wait(url)
+            last = attempt == max(1, self._max_tries) - 1
+            try:
+                async with session.get(url, params=params) as r:
+                    if r.status not in download.RETRY_STATUS:
+                        return await r.text()
+                    if last:
+                        r.raise_for_status()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if last:
+                    raise
+
+
+class AsyncQuickMeme(AsyncMemeSite):
+    """ The asyncio counterpart of :class:`meme_get.memesites.QuickMeme`
+    """
+
+    def __init__(self, parser=None, **kwargs):
+        super(AsyncQuickMeme, self).__init__("http://www.quickmeme.com/",
+                                             **kwargs)
+        self._posts_per_page = 10
+        # The HTML backend, see meme_get.parsers.QUICKMEME_PARSERS
+        self._parser = parser
+
+    async def _get_memes_helper(self, page_num):
+        """ Return a list of the memes on page_num page
+        """
+        text = await self._get_page(self._url + "page/{:d}/".format(page_num))
+        return parsers.quickmeme(text, parser=self._parser)
+
+
+class AsyncMemeGenerator(AsyncMemeSite):
+    """ The asyncio counterpart of :class:`meme_get.memesites.MemeGenerator`
+    """
+
+    def __init__(self, popular_type="Daily", **kwargs):
+        super(AsyncMemeGenerator, self).__init__(
+            "http://www.memegenerator.net", **kwargs)
+        self._api = "http://version1.api.memegenerator.net/"
+        self._method_entry = "Instances_Select_ByPopular"
+        self._posts_per_page = 15
+
+        if popular_type == "Daily":
+            self._popular_days = 1
+        elif popular_type == "Weekly":
+            self._popular_days = 7
+        elif popular_type == "Monthly":
+            self._popular_days = 30
+        else:
+            raise ValueError(
+                "Wrong popular type. Supported: Daily, Weekly, Monthly")
+
+    async def _get_memes_helper(self, page_num):
+        """ Return a list of the memes on a page of the API
+        """
+        payload = {"languageCode": "en",
+                   "pageIndex": page_num, "days": self._popular_days}
+        text = await self._get_page(self._api + self._method_entry, payload)
+        try:
+            json_memes = json.loads(text)
+        except ValueError as err:  # cannot decode json
+            sys.stderr.write("ERROR: {} \n".format(str(err)))
+            return []
+        return parsers.memegenerator(json_memes)
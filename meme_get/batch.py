@@ -1,6 +1,6 @@
 from .memesites import RedditMemes
 from .memesites import MemeGenerator
-import sys
+from .memesites import ocr_captions
 
 A = MemeGenerator()
 A_memes = A.get_memes(500)
@@ -15,12 +15,12 @@ B = RedditMemes()
 B_memes = B.get_memes(500)
 
 f2 = open('redditmemes.txt', 'w')
-for i in B_memes:
-    print("New meme: ", i)
-    try:
-        i.ocr_caption(method="Tesseract", thres=False, cfg="urban")
+results = ocr_captions(B_memes, method="Tesseract", timeout=60,
+                       thres=False, cfg="urban")
+for i, err in results:
+    if err is None:
         print(str(i.get_caption()))
         f2.write(str(i.get_caption()) + '\n')
-    except:
-        print("error: ", sys.exc_info()[0])
+    else:
+        print("error: ", i, repr(err))
 f2.close()
@@ -0,0 +1,37 @@
+""" Cache Directory Module
+
+meme_get keeps its caches in a per-user cache directory instead of the
+installed package directory. The location can be changed with the
+MEME_GET_CACHE_DIR environment variable.
+"""
+
+import os
+
+ENV_VAR = "MEME_GET_CACHE_DIR"
+
+
+def cache_dir(*parts):
+    """ Return a directory inside the meme_get cache directory
+
+    The cache directory is $MEME_GET_CACHE_DIR if set, otherwise
+    $XDG_CACHE_HOME/meme_get or ~/.cache/meme_get. The directory is
+    created if it does not exist.
+
+    :param parts: Names of sub-directories
+    :return: The path to the directory
+    :rtype: str
+    """
+    base = os.environ.get(ENV_VAR)
+    if not base:
+        xdg = os.environ.get("XDG_CACHE_HOME") or \
+            os.path.join(os.path.expanduser("~"), ".cache")
+        base = os.path.join(xdg, "meme_get")
+
+    path = os.path.join(base, *parts)
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:  # made by another process in the meantime
+            if not os.path.isdir(path):
+                raise
+    return path
@@ -0,0 +1,212 @@
+""" Download Module
+
+All picture and page downloads go through one pooled HTTP session per
+process, so that connections to the same host are kept alive and reused.
+Page requests are also spaced out per host and retried with backoff.
+"""
+
+from __future__ import absolute_import
+import hashlib
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from urllib.parse import urlparse
+except ImportError:  # Python 2
+    from urlparse import urlparse
+
+TIMEOUT = 20
+""" Default timeout of a request, in seconds.
+"""
+
+POOL_SIZE = 16
+""" Number of kept-alive connections per host.
+"""
+
+RATE = 5
+""" Default max number of page requests per second to a host.
+"""
+
+BACKOFF = 0.5
+""" Seconds waited before the first retry of a page; doubled every retry.
+"""
+
+MAX_BACKOFF = 8
+""" Max seconds waited between two tries of a page.
+"""
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+""" HTTP status codes of page responses worth retrying.
+"""
+
+_session = None
+_session_pid = None
+_lock = threading.Lock()
+
+
+def get_session():
+    """ Return the shared HTTP session of this process
+
+    A new session is made after a fork, so that processes never share
+    pooled connections.
+
+    :rtype: requests.Session
+    """
+    global _session, _session_pid
+    with _lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE,
+                                  pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+            _session_pid = os.getpid()
+        return _session
+
+
+class RateLimiter(object):
+    """ Space out the requests sent to each host
+
+    **Attributes:**
+        * _interval (float): Min seconds between two requests to a host
+    """
+
+    def __init__(self, rate=RATE):
+        self._interval = 1.0 / rate if rate else 0.0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        """ Block until a request to the host of a url may be sent
+
+        :param str url: The url about to be requested
+        """
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    def reserve(self, url):
+        """ Book the next slot for a request to the host of a url
+
+        :param str url: The url about to be requested
+        :return: Seconds to wait before sending the request
+        :rtype: float
+        """
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self._interval
+        return slot - now
+
+
+_limiter = RateLimiter()
+
+
+def get_page(url, params=None, timeout=TIMEOUT, tries=3, backoff=BACKOFF,
+             limiter=None):
+    """ Request a web page, retrying transient failures
+
+    Connection errors, timeouts and the RETRY_STATUS codes are retried,
+    waiting backoff seconds before the first retry and twice as long
+    before every next one, up to MAX_BACKOFF.
+
+    :param str url: The url of the page
+    :param dict params: The query string parameters
+    :param float timeout: Timeout of each try in seconds
+    :param int tries: Max number of tries
+    :param float backoff: Seconds waited before the first retry
+    :param RateLimiter limiter: Rate limit of the requests, the one shared
+        by this process when None
+    :return: The response, whatever its status if it is not retried
+    :rtype: requests.Response
+    :raises requests.RequestException: if the last try fails
+    """
+    if limiter is None:
+        limiter = _limiter
+    tries = max(1, tries)
+    for attempt in range(tries):
+        if attempt > 0:
+            time.sleep(min(MAX_BACKOFF, backoff * 2 ** (attempt - 1)))
+        limiter.wait(url)
+        try:
+            r = get_session().get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == tries - 1:
+                raise
+            continue
+        if r.status_code not in RETRY_STATUS:
+            return r
+    r.raise_for_status()
+    return r
+
+
+def image_url(url):
+    """ The url of a meme picture file
+
+    Some sites link to a picture page instead of the picture itself; those
+    serve the picture when ".jpg" is appended.
+    """
+    extensions = ['.jpg', '.png']
+    if url[-4:] not in extensions:
+        url += '.jpg'
+    return url
+
+
+def fetch(url, timeout=TIMEOUT):
+    """ Download a file into memory
+
+    :param str url: The url to download
+    :param float timeout: Timeout of the request in seconds
+    :return: The content of the file
+    :rtype: bytes
+    :raises requests.RequestException: if the download fails
+    """
+    r = get_session().get(url, timeout=timeout)
+    r.raise_for_status()
+    return r.content
+
+
+def filename(url):
+    """ A unique file name for the picture at a url
+    """
+    hashID = hashlib.sha1()
+    hashID.update(url.encode('utf-8'))
+    return hashID.hexdigest() + os.path.splitext(url)[1]
+
+
+def prefetch(memes, workers=8, directory=None, timeout=TIMEOUT):
+    """ Download the pictures of many memes concurrently
+
+    :param list memes: A list of Meme objects
+    :param int workers: Number of concurrent downloads
+    :param str directory: If given, pictures are saved in this directory
+        instead of kept in memory
+    :param float timeout: Timeout of each request in seconds
+    :return: A list of (meme, picture, error) tuples in the order of the
+        memes. The picture is the content of the file, or its path when
+        a directory is given, and None if the download failed with error.
+    :rtype: list
+    """
+    if directory is not None and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    def download(meme):
+        url = image_url(meme.get_pic_url())
+        try:
+            data = fetch(url, timeout)
+        except Exception as err:
+            return meme, None, err
+        if directory is None:
+            return meme, data, None
+        path = os.path.join(directory, filename(url))
+        with open(path, 'wb') as f:
+            f.write(data)
+        return meme, path, None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(download, memes))
@@ -0,0 +1,300 @@
+""" Image Cache Module
+
+A content-addressed store of downloaded meme pictures. Pictures are saved
+once per content hash and an SQLite index maps every url to its picture,
+along with the ETag and Last-Modified headers used to revalidate it. The
+store has a size cap; the least recently used pictures are evicted first.
+
+The cache is off by default, so that the library does not write to disk
+unasked. Turn it on with :func:`set_default_cache`.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+import contextlib
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from . import download
+from .cachedir import cache_dir
+
+MAX_BYTES = 500 * 1024 * 1024
+""" Default size cap of the image cache.
+"""
+
+MAX_AGE = 24 * 60 * 60
+""" Default number of seconds a picture is used without revalidation.
+"""
+
+_SCHEMA = """CREATE TABLE IF NOT EXISTS images (
+    url TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    modified TEXT,
+    checked REAL NOT NULL,
+    used REAL NOT NULL)"""
+
+
+class ImageCache(object):
+    """ An on-disk cache of meme pictures
+
+    **Attributes:**
+        * _directory (str): The directory holding the index and pictures
+        * _max_bytes (int): Max total size of the cached pictures
+        * _max_age (float): Seconds a picture is used without asking the
+          server whether it changed
+        * _timeout (float): Timeout of a download in seconds
+    """
+
+    def __init__(self, directory=None, max_bytes=MAX_BYTES, max_age=MAX_AGE,
+                 timeout=download.TIMEOUT):
+        if directory is None:
+            directory = cache_dir("images")
+        elif not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._timeout = timeout
+
+        with self._connect() as db:
+            db.execute(_SCHEMA)
+
+    def get(self, url, timeout=None):
+        """ Return the picture at a url, downloading it only if needed
+
+        A cached picture is revalidated with the server once it is older
+        than max_age. If the server cannot be reached or answers with an
+        error, the cached picture is used anyway.
+
+        :param str url: The url of the picture
+        :param float timeout: Timeout of the download in seconds
+        :return: The content of the picture, memory-mapped from the cache
+        :rtype: mmap.mmap or bytes
+        :raises requests.RequestException: if the picture is not cached
+            and cannot be downloaded
+        """
+        if timeout is None:
+            timeout = self._timeout
+        now = time.time()
+        row = self._lookup(url)
+
+        r = None
+        if row is not None:
+            digest, etag, modified, checked = row
+            if now - checked < self._max_age:
+                data = self._open(digest)
+                if data is not None:
+                    self._touch(url, now)
+                    return data
+            elif os.path.isfile(self._blob(digest)):
+                headers = {}
+                if etag:
+                    headers["If-None-Match"] = etag
+                if modified:
+                    headers["If-Modified-Since"] = modified
+                try:
+                    r = download.get_session().get(url, headers=headers,
+                                                   timeout=timeout)
+                except Exception:
+                    r = None
+
+                # Not modified, or the server failed
+                if r is None or r.status_code != 200:
+                    data = self._open(digest)
+                    if data is not None:
+                        self._touch(url, now, checked=r is not None and
+                                    r.status_code == 304)
+                        return data
+                    r = None
+
+        # Not cached, or evicted by another thread in the meantime
+        if r is None:
+            r = download.get_session().get(url, timeout=timeout)
+        r.raise_for_status()
+        digest = self._store(url, r.content, r.headers.get("ETag"),
+                             r.headers.get("Last-Modified"), now)
+        data = self._open(digest)
+        return data if data is not None else r.content
+
+    def warm(self, urls, workers=8):
+        """ Download many pictures into the cache concurrently
+
+        :param list urls: The urls of the pictures
+        :param int workers: Number of concurrent downloads
+        :return: A list of errors in the order of the urls, None for the
+            pictures that are cached
+        :rtype: list
+        """
+        def fetch(url):
+            try:
+                data = self.get(url)
+            except Exception as err:
+                return err
+            if isinstance(data, mmap.mmap):
+                data.close()
+            return None
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(fetch, urls))
+
+    def size(self):
+        """ Total size of the cached pictures in bytes
+
+        :rtype: int
+        """
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT DISTINCT digest, size FROM images").fetchall()
+        return sum(r[1] for r in rows)
+
+    def clear(self):
+        """ Remove every picture from the cache
+        """
+        with self._connect() as db:
+            digests = [r[0] for r in
+                       db.execute("SELECT DISTINCT digest FROM images")]
+            db.execute("DELETE FROM images")
+        for digest in digests:
+            self._remove(digest)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """ Open the index for one transaction
+        """
+        db = sqlite3.connect(os.path.join(self._directory, "index.sqlite"),
+                             timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _blob(self, digest):
+        """ Path of the picture with a content hash
+        """
+        return os.path.join(self._directory, digest[:2], digest)
+
+    def _open(self, digest):
+        """ Map a cached picture, or return None if it was evicted
+        """
+        try:
+            f = open(self._blob(digest), "rb")
+        except (IOError, OSError):
+            return None
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:  # cannot be mapped
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _remove(self, digest):
+        try:
+            os.remove(self._blob(digest))
+        except OSError:
+            pass
+
+    def _lookup(self, url):
+        with self._connect() as db:
+            return db.execute("SELECT digest, etag, modified, checked "
+                              "FROM images WHERE url = ?", (url,)).fetchone()
+
+    def _touch(self, url, now, checked=False):
+        with self._connect() as db:
+            if checked:
+                db.execute("UPDATE images SET used = ?, checked = ? "
+                           "WHERE url = ?", (now, now, url))
+            else:
+                db.execute("UPDATE images SET used = ? WHERE url = ?",
+                           (now, url))
+
+    def _store(self, url, content, etag, modified, now):
+        """ Save a downloaded picture and evict old ones over the size cap
+        """
+        digest = hashlib.sha1(content).hexdigest()
+        path = self._blob(digest)
+        if not os.path.isfile(path):
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError:  # the directory exists
+                pass
+            tmp = "{:s}.{:d}.{:d}.tmp".format(path, os.getpid(),
+                                               threading.current_thread().ident)
+            with open(tmp, "wb") as f:
+                f.write(content)
+            os.rename(tmp, path)
+
+        with self._connect() as db:
+            old = db.execute("SELECT digest FROM images WHERE url = ?",
+                             (url,)).fetchone()
+            db.execute("INSERT OR REPLACE INTO images VALUES "
+                       "(?, ?, ?, ?, ?, ?, ?)",
+                       (url, digest, len(content), etag, modified, now, now))
+            orphans = self._evict(db, url)
+            if old is not None and old[0] != digest:
+                orphans.append(old[0])
+            orphans = [d for d in orphans if db.execute(
+                "SELECT 1 FROM images WHERE digest = ?", (d,)).fetchone()
+                is None]
+        for d in orphans:
+            self._remove(d)
+        return digest
+
+    def _evict(self, db, keep):
+        """ Drop least recently used urls until the cache fits its cap
+
+        :return: The content hashes of the dropped urls
+        """
+        rows = db.execute("SELECT url, digest, size FROM images "
+                          "ORDER BY used").fetchall()
+        sizes = {}
+        for r in rows:
+            sizes[r[1]] = r[2]
+        total = sum(sizes.values())
+        refs = {}
+        for r in rows:
+            refs[r[1]] = refs.get(r[1], 0) + 1
+
+        dropped = []
+        for url, digest, size in rows:
+            if total <= self._max_bytes:
+                break
+            if url == keep:
+                continue
+            db.execute("DELETE FROM images WHERE url = ?", (url,))
+            refs[digest] -= 1
+            if refs[digest] == 0:
+                total -= size
+            dropped.append(digest)
+        return dropped
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """ Return the image cache used by Meme.ocr_caption
+
+    :return: The default ImageCache, or None if caching is turned off,
+        which it is until set_default_cache is called
+    """
+    with _default_lock:
+        return _default
+
+
+def set_default_cache(cache):
+    """ Replace the image cache used by Meme.ocr_caption
+
+    Use ``set_default_cache(ImageCache())`` to keep the pictures in the
+    meme_get cache directory.
+
+    :param cache: An ImageCache, or None to always download pictures
+    """
+    global _default
+    with _default_lock:
+        _default = cache
@@ -4,25 +4,31 @@ from __future__ import unicode_literals
 from __future__ import absolute_import
 from builtins import super
 from builtins import range
-from builtins import open
 from builtins import str
 from future import standard_library
 standard_library.install_aliases()
 
-import requests
 import sys
-import bs4
 import datetime
-import pickle
 import hashlib
+import itertools
 import math
 import os.path
 import io
-import praw
-import configparser
-from .ocr import ocrcomp
+import logging
+import mmap
+import multiprocessing
+import signal
+import threading
+from . import download
+from . import imagecache
+from . import ocrcache
+from . import sitecache
 from enum import Enum
-from collections import deque
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+_log = logging.getLogger(__name__)
 
 
 class Origins(Enum):
@@ -161,14 +167,21 @@ class Meme(object):
         """
         return self._tags
 
-    def ocr_caption(self, method="Tesseract", **kwargs):
+    def ocr_caption(self, method="Tesseract", image=None,
+                    timeout=download.TIMEOUT, **kwargs):
         """ Use ocr to update self caption
 
+        The picture is only downloaded if the meme does not have a
+        caption yet.
+
         **OCR Methods Available**
 
         * `Tesseract <https://github.com/tesseract-ocr/tesseract>`_:
           Open-source OCR Engine
         * FontMatching: Using Impact Font and template matching to conduct OCR
+        * Auto: Run FontMatching and four Tesseract settings concurrently
+          and keep the caption with the highest share of dictionary words,
+          stopping early once one is good enough
 
         When using Tesseract, users need to provide two keyword arguments:
 
@@ -177,6 +190,64 @@ class Meme(object):
             * cfg (str): a string representing the configuration to use
               for Tesseract
 
+        :param image: The picture of the meme, as bytes, a file-like
+            object or a file path, e.g. from
+            :func:`meme_get.download.prefetch`. When not given, it is
+            downloaded, through the image cache if one is turned on.
+            When the OCR cache is turned on, results are kept in it,
+            so OCR runs only once per picture and settings.
+        :param float timeout: Timeout of the picture download in seconds
+        :return: For the Auto method, the chosen
+            :class:`meme_get.ocr.ocrcomp.Candidate` with its score and
+            timing; None otherwise or when OCR did not run
+        """
+
+        if self._caption is None or len(self._caption) == 0:
+            # Create a file-like object from the picture
+            if image is None:
+                url = download.image_url(self._pic_url)
+                cache = imagecache.default_cache()
+                if cache is not None:
+                    image = cache.get(url, timeout)
+                else:
+                    image = download.fetch(url, timeout)
+            if isinstance(image, bytes):
+                path = io.BytesIO(image)
+            else:
+                path = image
+
+            try:
+                # Look for the result of an earlier run
+                results = ocrcache.default_cache()
+                if results is not None:
+                    # Only keep the settings the method uses
+                    thres = kwargs.get("thres")
+                    cfg = kwargs.get("cfg")
+                    if method != "Tesseract":
+                        thres = None
+                    if method == "FontMatching":
+                        cfg = None
+                    key = (ocrcache.image_digest(image), method, thres, cfg)
+                    caption = results.get(*key)
+                    if caption is not None:
+                        self._caption = caption
+                        return
+
+                result = self._run_ocr(method, path, kwargs)
+
+                if results is not None and self._caption is not None:
+                    results.put(*(key + (self._caption,)))
+                return result
+            finally:
+                if isinstance(image, mmap.mmap):
+                    image.close()
+        else:
+            print("Caption already exists.")
+
+    def _run_ocr(self, method, path, kwargs):
+        """ Run an OCR method on the picture and update self caption
+
+        :return: The chosen candidate for the Auto method, else None
         """
 
         def checkKwargs():
@@ -199,48 +270,44 @@ class Meme(object):
                 except KeyError:
                     raise KeyError("Legal entries: thres and cfg.")
 
-        # Create a file-like object using Requests and BytesIO
-        extensions = ['.jpg', '.png']
-        eurl = self._pic_url[-4:]
-        turl = self._pic_url
-
-        if eurl not in extensions:
-            turl += '.jpg'
-
-        r = requests.get(turl, stream=True)
-        path = io.BytesIO(r.content)
-
-        if self._caption is None or len(self._caption) == 0:
-            # run ocr routine
-            if method == "Tesseract":
-                checkKwargs()
-                print("Now performing OCR with"
-                      " Tesseract and {}".format(str(kwargs)))
-                result = ocrcomp.ocrTesseract(
-                    path, thres=kwargs["thres"], cfg=kwargs["cfg"])
-
-                self._caption = result
-            elif method == "FontMatching":
-                result = ocrcomp.ocr(path)
-                self._caption = result
-            elif method == "Auto":
-                checkKwargs()
-                A = ocrcomp.ocrcomp(path, ocrcomp.ocr,
-                                    lambda x: ocrcomp.ocrTesseract(
-                                        x, thres=True, cfg=kwargs["cfg"]),
-                                    lambda x: ocrcomp.ocrTesseract(
-                                        x, thres=True, cfg="Default"),
-                                    lambda x: ocrcomp.ocrTesseract(
-                                        x, thres=False, cfg=kwargs["cfg"]),
-                                    lambda x: ocrcomp.ocrTesseract(
-                                        x, thres=False, cfg="Default"))
-                self._caption = A[-1][-1]
-            else:
-                print(method)
-                raise ValueError("Not a supported mathod. Methods available: "
-                                 "Tesseract, FontMatching, Auto")
+        # The OCR code is only loaded when it is first needed
+        from .ocr import ocrcomp
+
+        # run ocr routine
+        if method == "Tesseract":
+            checkKwargs()
+            _log.debug("Now performing OCR with Tesseract and %s", kwargs)
+            result = ocrcomp.ocrTesseract(
+                path, thres=kwargs["thres"], cfg=kwargs["cfg"])
+
+            self._caption = result
+        elif method == "FontMatching":
+            result = ocrcomp.ocr(path)
+            self._caption = result
+        elif method == "Auto":
+            checkKwargs()
+            cfg = kwargs["cfg"]
+            candidates = [("FontMatching", ocrcomp.ocr)]
+            for thres in [True, False]:
+                for c in [cfg, "Default"]:
+                    candidates.append((
+                        "Tesseract(thres={}, cfg={})".format(thres, c),
+                        lambda x, thres=thres, c=c: ocrcomp.ocrTesseract(
+                            x, thres=thres, cfg=c)))
+            # Every candidate shares the decoded and thresholded picture
+            from .ocr import preprocess
+            from .ocr.memeocr import OcrImage
+            image = OcrImage(path, preprocess.DEFAULT)
+            # Candidates may still be running when best returns early
+            result = ocrcomp.best(image, candidates, release=image.close)
+            _log.debug("Auto picked %s with score %.2f in %.2fs",
+                       result.name, result.score, result.seconds)
+            self._caption = result.caption
+            return result
         else:
-            print("Caption already exists.")
+            print(method)
+            raise ValueError("Not a supported mathod. Methods available: "
+                             "Tesseract, FontMatching, Auto")
 
     def __hash__(self):
         """ Two memes are the same if they have the same urls and the same capture time
@@ -267,40 +334,184 @@ class Meme(object):
                     self._tags)
 
 
+class OcrTimeout(Exception):
+    """ Raised when OCR on a single meme takes too long
+    """
+    pass
+
+
+OCR_GRACE = 30
+""" Seconds ocr_captions waits for a meme beyond the OCR timeout, for the
+worker to load the OCR resources, before giving up on it.
+"""
+
+
+def _raise_timeout(signum, frame):
+    raise OcrTimeout("OCR timed out.")
+
+
+def _init_ocr_worker(method):
+    """ Load the OCR resources once per worker process
+    """
+    from .ocr import memeocr, wordlist
+    wordlist.load()
+    # Render the glyph templates
+    memeocr.OcrEngine()
+    if method in ("Tesseract", "Auto"):
+        from .ocr.tesseract import default_backend
+        backend = default_backend()
+        try:
+            backend.tool()
+            backend.dictionary()
+        except Exception:  # reported for every meme by _ocr_worker
+            pass
+
+
+def _ocr_worker(meme, method, timeout, kwargs):
+    """ Run OCR on one meme inside a worker process
+
+    SIGALRM cannot interrupt a long call into C code, so ocr_captions
+    also gives up on workers that do not answer in time.
+
+    :return: A tuple of the caption and the error raised, if any
+    """
+    # SIGALRM only exists on Unix; elsewhere the timeout is not enforced
+    alarm = timeout is not None and hasattr(signal, "SIGALRM")
+    if alarm:
+        handler = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        meme.ocr_caption(method, **kwargs)
+        return meme.get_caption(), None
+    except Exception as err:
+        return None, err
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, handler)
+
+
+def ocr_captions(memes, method="Tesseract", workers=None, timeout=None,
+                 **kwargs):
+    """ Use ocr to update the captions of many memes in parallel
+
+    The memes are spread over a pool of worker processes, each of which
+    loads the OCR resources once. The captions are written back to the
+    given Meme objects. With a timeout, a meme whose worker does not
+    answer within timeout + OCR_GRACE seconds gets an OcrTimeout error,
+    and the workers still busy at the end are terminated.
+
+    :param list memes: A list of Meme objects
+    :param str method: The OCR method, see :meth:`Meme.ocr_caption`
+    :param int workers: Number of worker processes, defaults to the
+        number of CPUs
+    :param float timeout: Max seconds of OCR for a single meme
+    :param kwargs: Keyword arguments for :meth:`Meme.ocr_caption`
+    :return: A list of (meme, error) tuples in the order of the memes,
+        where error is None or the exception raised for that meme
+    :rtype: list
+    """
+    wait = None if timeout is None else timeout + OCR_GRACE
+    # Unlike an executor, a Pool can terminate its busy workers
+    pool = multiprocessing.Pool(workers, _init_ocr_worker, (method,))
+    stop = True
+    try:
+        tasks = [pool.apply_async(_ocr_worker, (m, method, timeout, kwargs))
+                 for m in memes]
+
+        # Memes start in order, so a meme is running once the ones
+        # before it are done, and waiting for it is bounded
+        results = []
+        timed_out = False
+        for meme, task in zip(memes, tasks):
+            try:
+                caption, err = task.get(wait)
+            except multiprocessing.TimeoutError:
+                caption, err = None, OcrTimeout("OCR timed out.")
+                timed_out = True
+            except Exception as e:  # the worker itself failed
+                caption, err = None, e
+            if err is None:
+                meme._caption = caption
+            results.append((meme, err))
+        stop = timed_out
+    finally:
+        # Stop the workers still busy, or all of them if interrupted
+        if stop:
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+
+    return results
+
+
 class MemeSite(object):
     """ A super class for any sites with respect to memes.
 
     This class should be subclassed. The MemeSite is designed to keep
-    all Memes in a cache file, so that even if the Python process is
+    all Memes in a cache database (see :mod:`meme_get.sitecache`),
+    so that even if the Python process is
     terminated, the next time we run the save process, we don't need
     to re-download all the memes from the Internet. The _meme_pool
     and _meme_deque store memes, but the users should not view the memes
     in them as constant, as operations on the object will change the memes
     inside the pool and deque.
 
+    Making a MemeSite does no I/O. The cache is read, built or refreshed
+    when memes are first asked for, or ahead of time with :meth:`warm`.
+
     **Attributes:**
         * _url (str): URL for the website hosting memes
         * _max_tries (int): Max tries for http requests
+        * _workers (int): Max number of pages requested at once
         * _meme_pool (set): A set containing stored memes
         * _meme_deque (deque): A deque containing stored memes
         * _last_update (datetime object): The time of last download of memes
         * _cache_size (int): Number of memes stored on disk
-        * _maxcache_day (int): Max day of keeping the cache on disk
+        * _maxcache_day (int): Max day before the cache is refreshed
+        * _maxentry_day (int): Max day of keeping a meme in the cache
+          after it was last seen on the site
+        * _fetch_times (dict): The time each cached meme was last seen
+          on the site, by picture url
+        * _posts_per_page (int): Number of memes on a page of the site
+        * _cache (SiteCache): The cache the memes are stored in, or None
+          for the default one
     """
 
-    def __init__(self, url, cache_size=500, maxcache_day=1):
+    def __init__(self, url, cache_size=500, maxcache_day=1, maxentry_day=7,
+                 cache=None):
         self._url = url
-        self._max_tries = 10
+        self._max_tries = 3
+        self._workers = 8
         self._meme_pool = set()
         self._meme_deque = deque()
         self._last_update = datetime.datetime.now()
         self._cache_size = cache_size
         self._maxcache_day = maxcache_day
+        self._maxentry_day = maxentry_day
+        self._fetch_times = {}
+        self._posts_per_page = 10
+        self._cache = cache
+        self._cache_lock = threading.Lock()
+
+    def warm(self, background=False):
+        """ Read, build or refresh the cache before memes are asked for
 
+        :param bool background: Whether to return at once and do it in
+            a background thread
+        :return: With background, a Future whose result is None once the
+            cache is ready; None otherwise
+        :rtype: concurrent.futures.Future
+        """
+        if not background:
+            self._ensure_cache()
+            return None
+        executor = ThreadPoolExecutor(max_workers=1)
         try:
-            self._main_page = requests.get(url)
-        except Exception as err:
-            sys.stderr.write("ERROR: {} \n".format(str(err)))
+            return executor.submit(self._ensure_cache)
+        finally:
+            executor.shutdown(wait=False)
 
     def get_captions(self, num_memes):
         """ Return a list of captions.
@@ -315,10 +526,88 @@ class MemeSite(object):
     def get_memes(self, num_memes):
         """ Return a list of Memes.
 
+        :param int num_memes: Number of memes, from the most popular on
         :return: A list of Meme objects.
         :rtype: list
         """
-        raise NotImplementedError("Implement in subclasses.")
+        return list(self.iter_memes(num_memes))
+
+    def iter_memes(self, num_memes=None):
+        """ Yield Memes from the most popular on.
+
+        The cached memes come first, without any request, and only as
+        many as asked for are read from the cache. The pages after them
+        are then requested one at a time, each in the background while the
+        memes of the page before are being consumed, so work on the first
+        memes can start while later pages are downloading. Without
+        num_memes, memes are yielded until the site runs out, so the
+        generator can be cut with itertools.islice.
+
+        A missing cache is not built first: the memes are read from the
+        site as above, and the ones read up to cache_size are saved once
+        the generator is done. An expired cache is refreshed as its memes
+        are yielded, and the refresh is finished and saved even when the
+        generator is closed early.
+
+        :param int num_memes: Max number of memes, unlimited when None
+        :return: A generator of Meme objects
+        """
+        if num_memes is not None and num_memes <= 0:
+            return
+        seen = set()
+        refresh = self._ensure_cache(num_memes, stream=True)
+        if refresh is not None:
+            try:
+                for meme in refresh:
+                    if meme.get_pic_url() in seen:
+                        continue
+                    seen.add(meme.get_pic_url())
+                    yield meme
+                    if num_memes is not None and len(seen) >= num_memes:
+                        return
+            finally:
+                # Finish the refresh, so that the cache is saved
+                for meme in refresh:
+                    pass
+
+        cached = list(reversed(self._meme_deque))
+        updated = self._last_update
+        need_more = num_memes is None or num_memes > len(cached)
+        left = None if num_memes is None else num_memes - len(cached)
+
+        more = None
+        # The whole cache was read when more memes are needed than it has
+        grown = []
+        try:
+            for i, meme in enumerate(cached):
+                # Start on the next page before the cached memes run out
+                if need_more and more is None and \
+                        len(cached) - i <= self._posts_per_page:
+                    more = self._more_memes(len(cached), left)
+                if meme.get_pic_url() in seen:
+                    continue
+                seen.add(meme.get_pic_url())
+                yield meme
+                if num_memes is not None and len(seen) >= num_memes:
+                    return
+
+            if more is None:
+                more = self._more_memes(len(cached), left)
+            # Pages shift as memes are posted, so skip the ones yielded
+            for meme in more:
+                if meme.get_pic_url() in seen:
+                    continue
+                seen.add(meme.get_pic_url())
+                if len(cached) + len(grown) < self._cache_size:
+                    grown.append(meme)
+                yield meme
+                if num_memes is not None and len(seen) >= num_memes:
+                    return
+        finally:
+            if more is not None:
+                more.close()
+            if grown:
+                self._grow_cache(cached, grown, updated)
 
     def clean_meme_pool(self):
         """ Empty the meme pool
@@ -377,41 +666,37 @@ class MemeSite(object):
             r.append(self._meme_deque.pop())
         return r
 
-    def _read_cache(self):
-        """ Read the saved cache file (no side effects)
-        Read a tuple containing the data
+    def _store(self):
+        """ Return the SiteCache the memes are stored in
         """
+        if self._cache is not None:
+            return self._cache
+        return sitecache.default_cache()
 
-        if os.path.isfile(self._filepath()):
-            # Read the file in using Pickle
-            file_obj = open(self._filepath(), 'rb')
-            data = pickle.load(file_obj)
-            # print(data)
-            # self._read_data_tuple(data)
-            file_obj.close()
-            return data
-        else:
-            file_obj.close()
-            raise OSError("No cache exists.")
-
-    def _update_with_cache(self):
+    def _update_with_cache(self, limit=None):
         """ Update self states with cache
+
+        :param int limit: Max number of memes to read, all when None
+        :raises OSError: if the site is not cached
         """
-        data = self._read_cache()
-        self._read_data_tuple(data)
+        updated, memes = self._store().load(self._cache_key(), limit)
+        if updated is None:
+            raise OSError("No cache exists.")
+
+        # The most popular meme is popped first, from the right
+        self._meme_deque = deque(m for m, t in reversed(memes))
+        self._meme_pool = set(self._meme_deque)
+        self._fetch_times = dict((m.get_pic_url(), t) for m, t in memes)
+        self._last_update = updated
 
     def _save_cache(self):
-        """ Save the class to cache files
+        """ Save the memes and the update time to the cache
 
-        We put all the variables into a tuple, and then save that tuple
-        using pickle.
+        The memes replace the ones cached before in a single transaction.
         """
-        # Store all the variables into a tuple
-        # Save the data to a file with a unique name
-
-        file_obj = open(self._filepath(), 'wb')
-        pickle.dump(self._write_data_tuple(), file_obj)
-        file_obj.close()
+        memes = list(reversed(self._meme_deque))
+        self._store().save(self._cache_key(), self._url, self._last_update,
+                           [(m, self._fetch_time(m)) for m in memes])
 
     def _cache_expired(self):
         """ Check whether cache has expired. Also return false when cache doesn't exist
@@ -435,7 +720,7 @@ class MemeSite(object):
     def _no_cache(self):
         """ Check whether cache exists
         """
-        result = os.path.isfile(self._filepath())
+        result = self._store().updated(self._cache_key()) is not None
 
         if result:
             print("Cache for {} exists.".format(self._url))
@@ -444,44 +729,254 @@ class MemeSite(object):
 
         return not result
 
+    def _ensure_cache(self, limit=None, stream=False):
+        """ Build the cache if it does not exist, refresh it if it expired,
+        and read it into self states
+
+        Only one thread of the site does it at a time, so a background
+        warm and a get_memes never both build the cache.
+
+        :param int limit: Max number of memes to read from an up to date
+            cache, all when None
+        :param bool stream: Whether to leave building and refreshing to
+            the caller, which reads the site as it goes. A missing cache is
+            then left empty, to be grown with _grow_cache, and an expired
+            one is refreshed by the generator returned.
+        :return: With stream, a generator of the refreshed memes when the
+            cache expired; None otherwise
+        """
+        with self._cache_lock:
+            if self._no_cache():
+                if not stream:
+                    self._build_cache()
+                    return None
+                self.clean_meme_pool()
+                self.clean_meme_deque()
+                self._fetch_times = {}
+                self._last_update = None
+            elif self._cache_expired():
+                if stream:
+                    return self._refresh_memes()
+                self._refresh_cache()
+            else:
+                self._update_with_cache(limit)
+        return None
+
     def _build_cache(self):
         """ Build cache
         """
         print("Building cache for {}.".format(self._url))
+        self.clean_meme_pool()
+        self.clean_meme_deque()
         self._populate(self._cache_size)
+        self._fetch_times = dict((m.get_pic_url(), m.get_time())
+                                 for m in self._meme_deque)
+        self._last_update = datetime.datetime.now()
         self._save_cache()
 
-    def _populate(self):
-        """ Populate the meme pool and deque
+    def _grow_cache(self, cached, grown, updated):
+        """ Save the memes read past a cache smaller than cache_size
+
+        :param list cached: The memes of the cache, most popular first
+        :param list grown: The memes read after them
+        :param datetime.datetime updated: The update time of the cache,
+            None when there was none. Nothing is saved if another thread
+            saved the cache since.
         """
-        raise NotImplementedError("Implement in subclasses")
+        with self._cache_lock:
+            if self._store().updated(self._cache_key()) != updated:
+                return
+            now = datetime.datetime.now()
+            memes = cached + grown
+            self._meme_deque = deque(reversed(memes))
+            self._meme_pool = set(memes)
+            for meme in grown:
+                self._fetch_times[meme.get_pic_url()] = now
+            self._last_update = now if updated is None else updated
+            self._save_cache()
+
+    def _refresh_cache(self):
+        """ Bring an expired cache up to date with the site
+        """
+        for meme in self._refresh_memes():
+            pass
+
+    def _refresh_memes(self):
+        """ Bring an expired cache up to date with the site, yielding the
+        refreshed memes from the most popular on
+
+        The site is read from its most popular meme on, and only until a
+        page worth of memes in a row is already cached, so a refresh
+        costs about as many requests as there are new memes. Cached memes
+        seen again keep their Meme object and have their fetch time
+        renewed. Cached memes not seen for maxentry_day days are dropped,
+        and the least popular ones are dropped past cache_size.
+
+        The memes read from the site are yielded as they come, and the
+        cache is saved before the cached memes after them are yielded.
+        """
+        try:
+            self._update_with_cache()
+        except Exception:  # the cache cannot be read
+            self._build_cache()
+            for meme in reversed(self._meme_deque):
+                yield meme
+            return
+        print("Refreshing cache for {}.".format(self._url))
+
+        now = datetime.datetime.now()
+        max_age = datetime.timedelta(days=self._maxentry_day)
+
+        # The memes of the deque are popped from the right
+        cached = OrderedDict()
+        for meme in reversed(self._meme_deque):
+            if meme.get_pic_url() not in cached:
+                cached[meme.get_pic_url()] = meme
+        alive = set(url for url, meme in cached.items()
+                    if now - self._fetch_time(meme) <= max_age)
+
+        # Read the site until we are back among the cached memes
+        memes = []
+        seen = set()
+        total = len(alive)
+        run = 0
+        for meme in self._site_memes():
+            url = meme.get_pic_url()
+            if url in seen:
+                continue
+            seen.add(url)
+            if url in cached:
+                meme = cached[url]
+                run += 1
+            else:
+                run = 0
+            if url not in alive:
+                total += 1
+            self._fetch_times[url] = now
+            memes.append(meme)
+            yield meme
+
+            if len(memes) >= self._cache_size or \
+                    (run >= self._posts_per_page and
+                     total >= self._cache_size):
+                break
+
+        new = len(memes) - sum(1 for m in memes if m.get_pic_url() in cached)
+        read = len(memes)
+        memes += [m for url, m in cached.items()
+                  if url in alive and url not in seen]
+        memes = memes[:self._cache_size]
+
+        self._meme_deque = deque(reversed(memes))
+        self._meme_pool = set(memes)
+        self._fetch_times = dict((m.get_pic_url(), self._fetch_time(m))
+                                 for m in memes)
+        self._last_update = now
+        print("Found {:d} new memes for {}.".format(new, self._url))
+        self._save_cache()
+        for meme in memes[read:]:
+            yield meme
 
-    def _read_data_tuple(self, t_data):
-        """ Read in a data tuple and replace all the instance variables
+    def _fetch_time(self, meme):
+        """ The time a cached meme was last seen on the site
         """
-        raise NotImplementedError("Implement in subclasses.")
+        return self._fetch_times.get(meme.get_pic_url(), meme.get_time())
 
-    def _read_update_time_from_cache(self):
-        """ Read cache update time from cache file
+    def _site_memes(self):
+        """ Yield the memes of the site from the most popular on
+
+        Pages are only requested as they are needed, so the caller can
+        stop early.
         """
-        raise NotImplementedError("Implement in subclasses.")
+        page_num = 1
+        while True:
+            memes = self._get_memes_helper(page_num)
+            if len(memes) == 0:
+                return
+            for meme in memes:
+                yield meme
+            page_num += 1
 
-    def _write_data_tuple(self):
-        """ Write all internal states to a data tuple
+    def _get_memes_helper(self, page_num):
+        """ Return a list of the memes on a page of the site
         """
         raise NotImplementedError("Implement in subclasses.")
 
-    def _filename(self):
-        """ Use SHA1 hashing algorithm to calculate a unique file name
+    def _more_memes(self, skip, num=None):
+        """ Start requesting the memes after the first skip ones
+
+        :param int skip: Number of memes to start after
+        :param int num: Number of memes wanted, unlimited when None
+        :return: A _PagePrefetcher over the memes
         """
-        raise NotImplementedError("Implement in subclasses.")
+        return _PagePrefetcher(self._get_memes_helper,
+                               skip // self._posts_per_page + 1,
+                               skip % self._posts_per_page, num)
+
+    def _populate(self, num):
+        """ Populate the meme pool and deque with the first num memes
+
+        The pages are requested concurrently, by up to _workers threads,
+        so their round trips overlap. The requests still start no faster
+        than the per-host rate limit of :mod:`meme_get.download`. A page
+        that fails after its retries is reported and skipped, and the
+        memes of the other pages are added in page order. When the first
+        _workers pages to finish all failed, the site is taken to be down
+        and the rest are not waited for.
 
-    def _filepath(self):
-        """ Generate the path to the cache file
+        :raises Exception: the first error, if every page failed
         """
-        cdir = os.path.dirname(os.path.realpath(__file__))
-        tgt_path = os.path.join(cdir, self._filename())
-        return tgt_path
+        max_page = int(math.ceil(num / self._posts_per_page))
+        if max_page == 0:
+            return
+
+        pages = {}
+        errors = []
+        with ThreadPoolExecutor(
+                max_workers=min(self._workers, max_page)) as executor:
+            futures = dict((executor.submit(self._get_memes_helper, i), i)
+                           for i in range(1, max_page + 1))
+            for future in as_completed(futures):
+                try:
+                    pages[futures[future]] = future.result()
+                except Exception as err:
+                    sys.stderr.write("ERROR: page {:d} of {:s}: {} \n".format(
+                        futures[future], self._url, str(err)))
+                    errors.append(err)
+                    # The site is down, do not wait for the other pages
+                    if len(pages) == 0 and len(errors) >= self._workers:
+                        for f in futures:
+                            f.cancel()
+                        break
+        if len(pages) == 0:
+            raise errors[0]
+
+        left = num
+        for page_num in sorted(pages):
+            memes = pages[page_num]
+            for meme in memes[:left]:
+                self._meme_pool.add(meme)
+                self._meme_deque.appendleft(meme)
+            left -= min(left, len(memes))
+
+    def _read_update_time_from_cache(self):
+        """ Read cache update time from the cache, without its memes
+
+        :raises OSError: if the site is not cached
+        """
+        updated = self._store().updated(self._cache_key())
+        if updated is None:
+            raise OSError("No cache exists.")
+        return updated
+
+    def _cache_key(self):
+        """ Use SHA1 hashing algorithm to calculate a unique cache key
+        """
+        hashID = hashlib.sha1()
+        hashID.update(repr(self._url).encode('utf-8'))
+
+        # The key is the hexdecimal representation of the SHA1 hash
+        return hashID.hexdigest()
 
     def __repr__(self):
         return "Memesite URL:{:s} Pool:{!s} Update Time:{!s}"\
@@ -490,6 +985,76 @@ class MemeSite(object):
                     self._last_update)
 
 
+class _PagePrefetcher(object):
+    """ An iterator over the memes of the pages of a site
+
+    Every page is requested in a background thread as soon as the page
+    before it has been received, so the next page is downloading while
+    the memes of the current one are consumed. Once the memes received
+    cover the number wanted, later pages are only requested when they
+    are read. The pages end at the first page without memes.
+
+    **Attributes:**
+        * _fetch (function): Return the list of memes on a page number
+        * _page_num (int): The page number being requested
+        * _skip (int): Number of memes to drop from the first page
+        * _left (int): Number of memes still wanted, unlimited when None
+        * _memes (deque): The memes received and not consumed yet
+    """
+
+    def __init__(self, fetch, page_num=1, skip=0, num=None):
+        self._fetch = fetch
+        self._page_num = page_num
+        self._skip = skip
+        self._left = num
+        self._memes = deque()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future = self._executor.submit(fetch, page_num)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while len(self._memes) == 0:
+            if self._closed:
+                raise StopIteration
+            if self._future is None:  # more memes than wanted are read
+                self._future = self._executor.submit(self._fetch,
+                                                     self._page_num)
+            try:
+                memes = self._future.result()
+            except Exception:
+                self.close()
+                raise
+            self._future = None
+            if len(memes) == 0:
+                self.close()
+                raise StopIteration
+            memes = memes[self._skip:]
+            self._skip = 0
+            self._memes.extend(memes)
+
+            self._page_num += 1
+            if self._left is not None:
+                self._left -= len(memes)
+            if self._left is None or self._left > 0:
+                self._future = self._executor.submit(self._fetch,
+                                                     self._page_num)
+        return self._memes.popleft()
+
+    next = __next__
+
+    def close(self):
+        """ Stop requesting pages
+        """
+        self._closed = True
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
+        self._executor.shutdown(wait=False)
+
+
 class QuickMeme(MemeSite):
     """ The MemeSite subclass that deals with the quickmeme site.
 
@@ -502,73 +1067,15 @@ class QuickMeme(MemeSite):
     of an image and an alternative text
     """
 
-    def __init__(self, cache_size=500, maxcache_day=1):
+    def __init__(self, cache_size=500, maxcache_day=1, maxentry_day=7,
+                 cache=None, parser=None):
         super(QuickMeme, self).__init__(
-            "http://www.quickmeme.com/", cache_size, maxcache_day)
+            "http://www.quickmeme.com/", cache_size, maxcache_day,
+            maxentry_day, cache)
         self._posts_per_page = 10
         self._origin = Origins.QUICKMEME
-
-        if self._no_cache() or self._cache_expired():
-            self._build_cache()
-
-    def get_memes(self, num_memes):
-        """
-        Get a number of memes from Quickmeme.com
-        """
-        # Check the time difference and whether the
-        # cache has been created
-        if self._no_cache() or self._cache_expired():
-            self._build_cache()
-        else:
-            # Read in saved memes
-            self._update_with_cache()
-
-        # Check whether we have enough memes
-        if self._cache_size >= num_memes:
-            return self._pop_memes(num_memes)
-        else:
-            # Find the page number of the last page
-            pnum = math.ceil(num_memes / self._posts_per_page)
-
-            curl = self._url + "page/{:d}/".format(pnum)
-            cpage = requests.get(curl)
-            csoup = bs4.BeautifulSoup(cpage.text, 'html.parser')
-            # Extract posts from current page
-            meme_posts = csoup.find_all(
-                class_="post-image", limit=num_memes % self._posts_per_page)
-
-            # Extract captions and picture urls from posts
-            texts = [str(x['alt']).rpartition("  ") for x in meme_posts]
-            urls = [str(x['src']) for x in meme_posts]
-
-            # Get the additional memes
-            # Start from the meme after the last one in cache
-            for i in range(self._cache_size % self._posts_per_page,
-                           len(meme_posts)):
-                time = datetime.datetime.now()
-                meme = Meme(urls[i], time, caption=texts[i][0],
-                            origin=self._origin, tags=[texts[i][-1]])
-                self._meme_pool.add(meme)
-                self._meme_deque.appendleft(meme)
-
-            result = self._pop_memes(self.num_memes)
-            return result
-
-    def _populate(self, num):
-        """ Populate the meme pool and deques
-        """
-        # Each page on quickmeme contains 10 meme posts
-        # So the number of pages to crawl is:
-        # num_memes / posts_per_page + mod ( num_memes, posts_per_page)
-        max_page = math.ceil(num / self._posts_per_page)
-        for i in range(1, max_page + 1):
-            if i != max_page:
-                self._memes_on_page(i, self._posts_per_page)
-            else:
-                self._memes_on_page(i, num % self._posts_per_page)
-
-        # Current date and time
-        self._last_update = datetime.datetime.now()
+        # The HTML backend, see meme_get.parsers.QUICKMEME_PARSERS
+        self._parser = parser
 
     def _memes_on_page(self, page_num, n):
         """Get n memes from page_num page
@@ -588,59 +1095,29 @@ class QuickMeme(MemeSite):
         if n > self._posts_per_page:
             return None
 
-        curl = self._url + "page/{:d}/".format(page_num)
-        cpage = requests.get(curl)
-        csoup = bs4.BeautifulSoup(cpage.text, 'html.parser')
-        # Extract posts from current page
-        meme_posts = csoup.find_all(class_="post-image", limit=n)
-
-        # Extract captions and picture urls from posts
-        texts = [str(x['alt']).rpartition("  ") for x in meme_posts]
-        urls = [str(x['src']) for x in meme_posts]
-
         # Populate the _meme_pool
-        for i in range(len(meme_posts)):
-            time = datetime.datetime.now()
-            meme = Meme(urls[i], time, texts[i][0],
-                        self._origin, [texts[i][-1]])
+        for meme in self._get_memes_helper(page_num, n):
             self._meme_pool.add(meme)
             self._meme_deque.appendleft(meme)
 
-    def _filename(self):
-        """ Use SHA1 hashing algorithm to calculate a unique file name
-        """
-        hashID = hashlib.sha1()
-        hashID.update(repr(self._url).encode('utf-8'))
+    def _get_memes_helper(self, page_num, n=None):
+        """ Return a list of the first n memes on page_num page
 
-        # Create a file name with hexdecimal representation of the SHA1 hash
-        file_name = "cache_{:s}.memecache".format(hashID.hexdigest())
-        return file_name
-
-    def _read_data_tuple(self, t_data):
-        """ Read in a data tuple and replace all the instance variables
+        All the memes on the page are returned when n is None.
         """
-        self._url = t_data[0]
-        self._max_tries = t_data[1]
-        self._meme_pool = t_data[2]
-        self._meme_deque = t_data[3]
-        self._last_update = t_data[4]
-        self._cache_size = t_data[5]
-        self._maxcache_day = t_data[6]
+        return self._parse_page(self._fetch_page(page_num), n)
 
-    def _read_update_time_from_cache(self):
-        """ Read cache update time from cache file
+    def _fetch_page(self, page_num):
+        """ Request page_num page, retrying transient failures
         """
-        dtuple = self._read_cache()
-
-        return dtuple[4]
+        curl = self._url + "page/{:d}/".format(page_num)
+        return download.get_page(curl, tries=self._max_tries)
 
-    def _write_data_tuple(self):
-        """ Write all internal states to a data tuple
+    def _parse_page(self, cpage, n=None):
+        """ Return a list of the first n memes in a page response
         """
-        data = (self._url, self._max_tries, self._meme_pool,
-                self._meme_deque, self._last_update, self._cache_size,
-                self._maxcache_day)
-        return data
+        from . import parsers
+        return parsers.quickmeme(cpage.text, n, self._parser)
 
 
 class MemeGenerator(MemeSite):
@@ -648,15 +1125,21 @@ class MemeGenerator(MemeSite):
     """
 
     def __init__(self, cache_size=500, maxcache_day=1,
-                 popular_type="Daily", timeout=20):
+                 popular_type="Daily", timeout=20, maxentry_day=7,
+                 cache=None):
         """ The __init__ method for MemeGenerator class
 
         Args:
             cache_size (int): Number of memes stored as cache
             maxcache_day (int): Number of days until the cache expires
+            maxentry_day (int): Number of days a meme stays in the cache
+                after it was last seen on the site
+            cache (SiteCache): Where the memes are cached, the default
+                site cache when None
         """
         super(MemeGenerator, self).__init__(
-            "http://www.memegenerator.net", cache_size, maxcache_day)
+            "http://www.memegenerator.net", cache_size, maxcache_day,
+            maxentry_day, cache)
         self._origin = Origins.MEMEGENERATOR
         self._api = "http://version1.api.memegenerator.net/"
         self._method_entry = "Instances_Select_ByPopular"
@@ -673,55 +1156,6 @@ class MemeGenerator(MemeSite):
 
         self._timeout = timeout
         self._posts_per_page = 15
-        if self._no_cache() or self._cache_expired():
-            self._build_cache()
-
-    def get_memes(self, num_memes):
-        """ Get a number of memes from memegenerator.net
-        """
-
-        if self._no_cache() or self._cache_expired():
-            self._build_cache()
-        else:
-            self._update_with_cache()
-
-        if self._cache_size >= num_memes:
-            return self._pop_memes(num_memes)
-        else:
-            # Caculate the additional pages we need to scrap to get the
-            # remaining memes.
-            result = self._pop_memes(self._cache_size)
-            pnum = math.ceil(num_memes / self._posts_per_page)
-            print("Last page: ", pnum)
-            first_pnum = math.ceil(self._cache_size / self._posts_per_page)
-            additional_memes = []
-
-            # Get all the additional memes
-            # Notice that we are double counting some of our original cached
-            # memes and counting more memes than we needed on the last page
-            for i in range(first_pnum, pnum + 1):
-                additional_memes = additional_memes + self._get_memes_helper(i)
-
-            # Get ride of the additional memes and resolve the double counting
-            # issue
-            pre_index = self._cache_size % self._posts_per_page
-            waste = self._posts_per_page * pnum - num_memes
-
-            additional_memes = additional_memes[
-                pre_index:len(additional_memes) - waste]
-
-            result = result + additional_memes
-            return result
-
-    def _populate(self, num):
-        """ Populate the meme pool and deque
-        """
-        max_page = math.ceil(num / self._posts_per_page)
-        for i in range(1, max_page + 1):
-            if i != max_page:
-                self._memes_on_page(i, self._posts_per_page)
-            else:
-                self._memes_on_page(i, num % self._posts_per_page)
 
     def _get_memes_helper(self, page_num):
         """ Helper function for the get_memes() function
@@ -729,68 +1163,28 @@ class MemeGenerator(MemeSite):
         Return a list of memes on the specified page given. This function
         uses the API of the memegenerator.net
         """
+        return self._parse_page(self._fetch_page(page_num))
+
+    def _fetch_page(self, page_num):
+        """ Request a page of the API, retrying transient failures
+        """
         url = self._api + self._method_entry
         payload = {"languageCode": "en",
                    "pageIndex": page_num, "days": self._popular_days}
-        r = requests.get(url, params=payload, timeout=self._timeout)
+        return download.get_page(url, params=payload, timeout=self._timeout,
+                                 tries=self._max_tries)
 
+    def _parse_page(self, r):
+        """ Return a list of the memes in an API response
+        """
         try:
             json_memes = r.json()
         except ValueError as err:  # cannot decode json
             sys.stderr.write("ERROR: {} \n".format(str(err)))
+            return []
 
-        cmemes = json_memes["result"]
-        meme_list = []
-
-        for x in cmemes:
-
-            # Picture url
-            instance_image_url = ""
-            try:
-                instance_image_url = x["instanceImageUrl"]
-            except KeyError:
-                pass
-
-            # Caption
-            ccaption = x["text0"]
-            try:
-                extra = " --- " + x["text1"]
-                ccaption += extra
-            except TypeError:  # Returned json sometimes doesn't have text1
-                pass
-            except KeyError:  # Does not have the text1 tags
-                pass
-
-            # Raw image (meme macro) url
-            imageUrl = ""
-            try:
-                imageUrl = x["imageUrl"]
-            except KeyError:
-                pass
-
-            # Tags
-            ctags = []
-            try:
-                ctags += [x["displayName"]]
-            except KeyError:
-                pass
-
-            cscore = -1
-            try:
-                cscore = x["totalVotesScore"]
-            except KeyError:
-                pass
-
-            cmeme = Meme(instance_image_url,
-                         datetime.datetime.now(),
-                         caption=ccaption,
-                         raw_pic_url=imageUrl,
-                         origin=self._origin,
-                         tags=ctags,
-                         score=cscore)
-            meme_list.append(cmeme)
-
-        return meme_list
+        from . import parsers
+        return parsers.memegenerator(json_memes)
 
     def _memes_on_page(self, page_num, n):
         """ Get num memes on page
@@ -810,8 +1204,8 @@ class MemeGenerator(MemeSite):
             self._meme_pool.add(meme_list[i])
             self._meme_deque.appendleft(meme_list[i])
 
-    def _filename(self):
-        """ Override superclass _filename method
+    def _cache_key(self):
+        """ Override superclass _cache_key method
 
         The reason why we need to override is because for the
         memegenerator.net website, it ranks memes in different
@@ -822,153 +1216,96 @@ class MemeGenerator(MemeSite):
         hashID = hashlib.sha1()
         hashID.update(repr(self._url).encode('utf-8'))
         hashID.update(repr(self._popular_days).encode('utf-8'))
-        # Create a file name with hexdecimal representation of the SHA1
-        # hash
-        file_name = "cache_{:s}.memecache".format(hashID.hexdigest())
-        return file_name
-
-    def _write_data_tuple(self):
-        """ Write all internal states to a data tuple
-        """
-        data = (self._url, self._max_tries, self._meme_pool,
-                self._meme_deque, self._last_update, self._cache_size,
-                self._maxcache_day, self._popular_days)
-        return data
-
-    def _read_data_tuple(self, t_data):
-        """ Read in a data tuple and replace all the instance variables
-        """
-        self._url = t_data[0]
-        self._max_tries = t_data[1]
-        self._meme_pool = t_data[2]
-        self._meme_deque = t_data[3]
-        self._last_update = t_data[4]
-        self._cache_size = t_data[5]
-        self._maxcache_day = t_data[6]
-        self._popular_days = t_data[7]
-
-    def _read_update_time_from_cache(self):
-        """ Read cache update time from cache file
-        """
-        dtuple = self._read_cache()
-
-        return dtuple[4]
+        # The key is the hexdecimal representation of the SHA1 hash
+        return hashID.hexdigest()
 
 
 class RedditMemes(MemeSite):
 
     def __init__(self, cache_size=500, maxcache_day=1,
-                 popular_type="Daily", timeout=20):
+                 popular_type="Daily", timeout=20, maxentry_day=7,
+                 cache=None):
         """ The __init__ method for MemeGenerator class
 
         Args:
             cache_size (int): Number of memes stored as cache
             maxcache_day (int): Number of days until the cache expires
+            maxentry_day (int): Number of days a meme stays in the cache
+                after it was last seen on the site
+            cache (SiteCache): Where the memes are cached, the default
+                site cache when None
         """
         super(RedditMemes, self).__init__(
-            "https://www.reddit.com/r/memes/", cache_size, maxcache_day)
+            "https://www.reddit.com/r/memes/", cache_size, maxcache_day,
+            maxentry_day, cache)
         self._origin = Origins.REDDITMEMES
 
-        # Client ID and user agent requested by Reddit API
-        config = configparser.ConfigParser()
-
-        cdir = os.path.dirname(os.path.realpath(__file__))
-        config.read(os.path.join(cdir, 'config.ini'))
-
-        self._client_id = config['Reddit']['ClientID']
-        self._client_secret = config['Reddit']['ClientSecret']
-        if self._client_secret == '':
-            self._client_secret = None
-        self._user_agent = config['Reddit']['UserAgent'].format(sys.platform)
+        # The credentials are read and the Reddit instance is made on
+        # first use
+        self._reddit = None
+        self._reddit_lock = threading.Lock()
 
-        # Generate a Reddit instance
-        self._reddit = praw.Reddit(client_id=self._client_id,
-                                   client_secret=self._client_secret,
-                                   user_agent=self. _user_agent)
+    def _get_reddit(self):
+        """ Return the PRAW Reddit instance, making it on first use
 
-        if self._no_cache() or self._cache_expired():
-            self._build_cache()
-
-    def get_memes(self, num):
-        """ Get memes from Reddit /r/meme subreddit
+        The client ID and user agent requested by the Reddit API are read
+        from config.ini.
         """
-        if self._no_cache() or self._cache_expired():
-            self._build_cache()
-        else:
-            self._update_with_cache()
-
-        if self._cache_size >= num:
-            return self._pop_memes(num)
-        else:
-            # Haven't found a way to get memes
-            # in a specific range using PRAW
-            results = self._reddit.subreddit('memes').hot(limit=num)
-            meme_results = []
-
-            for submission in results:
-
-                # Get required properties for the memes
-                ctitle = submission.title
-                curl = submission.url
-
-                cmeme = Meme(curl, datetime.datetime.now(),
-                             title=ctitle,
-                             origin=Origins.REDDITMEMES)
-                meme_results.append(cmeme)
-
-            return meme_results
+        with self._reddit_lock:
+            if self._reddit is None:
+                # configparser and praw are only needed for Reddit, so
+                # they are loaded here
+                import configparser
+                import praw
+
+                config = configparser.ConfigParser()
+                cdir = os.path.dirname(os.path.realpath(__file__))
+                config.read(os.path.join(cdir, 'config.ini'))
+
+                client_secret = config['Reddit']['ClientSecret']
+                if client_secret == '':
+                    client_secret = None
+                self._reddit = praw.Reddit(
+                    client_id=config['Reddit']['ClientID'],
+                    client_secret=client_secret,
+                    user_agent=config['Reddit']['UserAgent'].format(
+                        sys.platform))
+            return self._reddit
 
     def _populate(self, num):
         """ Populate the meme pool and deque
 
         This method uses the reddit API wrapper PRAW library.
         """
-        # Get num submissions
-        results = self._reddit.subreddit('memes').hot(limit=num)
         # Save each submissions into the deque and pool
-        for submission in results:
-
-            # Get required properties for the memes
-            ctitle = submission.title
-            curl = submission.url
-
-            cmeme = Meme(curl, datetime.datetime.now(),
-                         title=ctitle,
-                         origin=Origins.REDDITMEMES)
+        for cmeme in self._hot(num):
             self._meme_pool.add(cmeme)
             self._meme_deque.appendleft(cmeme)
 
-    def _filename(self):
-        """ Generate a unique filename for the RedditMemes cache file
+    def _site_memes(self):
+        """ Yield the hot submissions of /r/memes as memes
         """
-        hashID = hashlib.sha1()
-        hashID.update(repr(self._url).encode('utf-8'))
+        return self._hot(self._cache_size)
 
-        # Create a file name with hexdecimal representation of the SHA1 hash
-        file_name = "cache_{:s}.memecache".format(hashID.hexdigest())
-        return file_name
+    def _more_memes(self, skip, num=None):
+        """ Start requesting the hot submissions after the first skip ones
 
-    def _write_data_tuple(self):
-        """ Write all internal states to a data tuple
+        PRAW has no way to start a listing at some rank, so the first skip
+        submissions are read and thrown away.
         """
-        data = (self._url, self._max_tries, self._meme_pool,
-                self._meme_deque, self._last_update, self._cache_size,
-                self._maxcache_day)
-        return data
+        memes = itertools.islice(self._hot(None), skip, None)
+        return _PagePrefetcher(
+            lambda page_num: list(itertools.islice(memes, 100)), num=num)
 
-    def _read_data_tuple(self, t_data):
-        """ Read in a data tuple and replace all the instance variables
-        """
-        self._url = t_data[0]
-        self._max_tries = t_data[1]
-        self._meme_pool = t_data[2]
-        self._meme_deque = t_data[3]
-        self._last_update = t_data[4]
-        self._cache_size = t_data[5]
-        self._maxcache_day = t_data[6]
+    def _hot(self, limit):
+        """ Yield the hot submissions of /r/memes as memes
 
-    def _read_update_time_from_cache(self):
-        """ Read update time from cache
+        PRAW requests the listing in batches of 100 as it is read.
+
+        :param int limit: Max number of submissions, unlimited when None
         """
-        dtuple = self._read_cache()
-        return dtuple[4]
+        results = self._get_reddit().subreddit('memes').hot(limit=limit)
+        for submission in results:
+            yield Meme(submission.url, datetime.datetime.now(),
+                       title=submission.title,
+                       origin=Origins.REDDITMEMES)
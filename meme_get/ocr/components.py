@@ -0,0 +1,109 @@
+""" Connected Component Labeling Module
+
+Labels the 4-connected regions of a boolean mask in one sweep. The mask
+is cut into horizontal runs of set pixels, runs that overlap on adjacent
+rows are merged with a union-find, and pixel counts and bounding boxes
+are then gathered per component with array operations.
+"""
+
+from __future__ import division
+from builtins import range
+from collections import namedtuple
+import numpy as np
+
+Component = namedtuple("Component", ["label", "size", "bounds"])
+""" A connected component: its label in the label image, its number of
+pixels and its (xmin, ymin, xmax, ymax) bounding box, inclusive.
+"""
+
+
+def runs(mask):
+    """ Find the horizontal runs of set pixels in a mask
+
+    :param mask: A 2D boolean array
+    :return: The row, first column and end column (exclusive) of every
+        run, in row-major order
+    :rtype: tuple of numpy.ndarray
+    """
+    h, w = mask.shape
+    padded = np.zeros((h, w + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    ends = np.nonzero(edges == -1)[1]
+    return rows, starts, ends
+
+
+def _find(parent, i):
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+
+def _links(rows, starts, ends, w):
+    """ Pairs of runs on adjacent rows that share a column
+    """
+    # Each run is keyed by its position in the flattened image, so one
+    # searchsorted finds the overlapping runs on the row above for all runs
+    width = w + 1
+    startkeys = rows * width + starts
+    endkeys = rows * width + ends
+    above = (rows - 1) * width
+    lo = np.searchsorted(endkeys, above + starts, side="right")
+    hi = np.searchsorted(startkeys, above + ends, side="left")
+    counts = np.maximum(hi - lo, 0)
+
+    below = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                  counts)
+    return np.repeat(lo, counts) + offsets, below
+
+
+def label(mask):
+    """ Label the 4-connected components of a mask
+
+    :param mask: A 2D boolean array
+    :return: A label image of the same shape as the mask, where 0 is the
+        background and components are numbered from 1, and the list of
+        components indexed by label - 1
+    :rtype: tuple
+    """
+    h, w = mask.shape
+    rows, starts, ends = runs(mask)
+
+    parent = list(range(len(rows)))
+    for a, b in zip(*_links(rows, starts, ends, w)):
+        ra = _find(parent, a)
+        rb = _find(parent, b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    roots = np.array([_find(parent, i) for i in range(len(parent))],
+                     dtype=np.intp)
+
+    # Number components by their first run, i.e. in row-major order
+    comp = np.unique(roots, return_inverse=True)[1].reshape(-1)
+    n = comp.max() + 1 if len(comp) else 0
+
+    lengths = ends - starts
+    sizes = np.bincount(comp, weights=lengths, minlength=n).astype(np.intp)
+    xmin = np.full(n, w, dtype=np.intp)
+    np.minimum.at(xmin, comp, starts)
+    xmax = np.full(n, -1, dtype=np.intp)
+    np.maximum.at(xmax, comp, ends - 1)
+    ymin = np.full(n, h, dtype=np.intp)
+    np.minimum.at(ymin, comp, rows)
+    ymax = np.full(n, -1, dtype=np.intp)
+    np.maximum.at(ymax, comp, rows)
+
+    # Runs are in row-major order, just like the set pixels of the mask
+    labels = np.zeros(h * w, dtype=np.int32)
+    labels[np.flatnonzero(mask)] = np.repeat(comp + 1, lengths)
+
+    components = [Component(i + 1, int(sizes[i]),
+                            (int(xmin[i]), int(ymin[i]),
+                             int(xmax[i]), int(ymax[i])))
+                  for i in range(n)]
+    return labels.reshape(h, w), components
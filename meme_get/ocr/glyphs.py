@@ -0,0 +1,167 @@
+""" Glyph Template Module
+
+The FontMatching OCR compares character areas with rendered Impact glyphs.
+The glyphs only depend on the font and the character set, so they are
+rendered once per process and kept as a packed (characters, 110, 100)
+array of grayscale pixels. They can also be saved to a template file,
+so that a new process does not need to render them at all.
+"""
+
+from __future__ import division
+import hashlib
+import os
+import threading
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# characters to recognize
+C = "ABCDEFGHIJKLMNOPQRSTUVWXYZ123456789"
+
+FONT = os.path.join(os.path.dirname(__file__), "fonts/Impact.ttf")
+
+# glyph image size and font size
+SIZE = (100, 110)
+FONT_SIZE = 124
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def firstwhitex(glyph):
+    """ Find the left cutoff of a character glyph
+
+    :param glyph: A 2D array of grayscale pixels
+    :return: The first column with a white pixel, or the glyph width
+    :rtype: int
+    """
+    cols = np.flatnonzero((glyph == 255).any(axis=0))
+    if len(cols) == 0:
+        return glyph.shape[1]
+    return int(cols[0])
+
+
+def render(charset=C, font=FONT):
+    """ Render the glyphs of a character set
+
+    Every character is drawn white on black and shifted left so that it
+    starts at the first column.
+
+    :param str charset: The characters to render
+    :param str font: Path to the TrueType font
+    :return: A (len(charset), 110, 100) array of grayscale glyphs
+    :rtype: numpy.ndarray
+    """
+    ft = ImageFont.truetype(font, FONT_SIZE)
+    result = np.zeros((len(charset), SIZE[1], SIZE[0]), dtype=np.uint8)
+
+    for i in range(0, len(charset)):
+        im = Image.new("L", SIZE)
+        ImageDraw.Draw(im).text((0, -25), charset[i], 255, font=ft)
+        fwx = firstwhitex(np.asarray(im))
+
+        im = Image.new("L", SIZE)
+        ImageDraw.Draw(im).text((-fwx, -26), charset[i], 255, font=ft)
+        result[i] = np.asarray(im)
+
+    return result
+
+
+def templatekey(charset=C, font=FONT):
+    """ A key identifying the glyphs of a font and character set
+
+    :return: A hex digest of the font file, the character set and the
+        rendering sizes
+    :rtype: str
+    """
+    h = hashlib.sha1()
+    with open(font, "rb") as f:
+        h.update(f.read())
+    h.update(repr((charset, SIZE, FONT_SIZE)).encode("utf-8"))
+    return h.hexdigest()
+
+
+def templatepath(directory, charset=C, font=FONT):
+    """ Path of the template file for a font and character set
+
+    :param str directory: The directory holding template files
+    """
+    return os.path.join(directory,
+                        "glyphs_{:s}.npy".format(templatekey(charset, font)))
+
+
+def templates(charset=C, font=FONT, directory=None):
+    """ Get the glyphs of a character set, rendering them at most once
+
+    :param str charset: The characters to render
+    :param str font: Path to the TrueType font
+    :param str directory: If given, glyphs are loaded from a template file
+        in this directory, which is written if it does not exist yet
+    :return: A read-only (len(charset), 110, 100) array of glyphs
+    :rtype: numpy.ndarray
+    """
+    key = (charset, font)
+    with _lock:
+        if key not in _cache:
+            glyphs = None
+            if directory is not None:
+                path = templatepath(directory, charset, font)
+                if os.path.isfile(path):
+                    glyphs = np.load(path)
+                else:
+                    glyphs = render(charset, font)
+                    if not os.path.isdir(directory):
+                        os.makedirs(directory)
+                    # write to a temporary file first, so other processes
+                    # never load a half-written template
+                    tmp = "{:s}.{:d}.tmp".format(path, os.getpid())
+                    with open(tmp, "wb") as f:
+                        np.save(f, glyphs)
+                    os.rename(tmp, path)
+            else:
+                glyphs = render(charset, font)
+            glyphs.setflags(write=False)
+            _cache[key] = glyphs
+        return _cache[key]
+
+
+def match(mask, bounds, glyphs):
+    """ Score character areas against every glyph at once
+
+    Each area is resampled to the glyph grid, scaling by its height. A
+    glyph pixel inside the area scores +1 if it agrees with the mask and
+    -1 if not; a lit glyph pixel right of the area scores -1.
+
+    :param mask: A 2D boolean array, True for text pixels
+    :param list bounds: (xmin, ymin, xmax, ymax) boundaries of the areas,
+        as returned by ``memeocr.getbounds``
+    :param glyphs: A (characters, 110, 100) array of glyphs
+    :return: An (areas, characters) array of scores
+    :rtype: numpy.ndarray
+    """
+    h, w = mask.shape
+    n, gh, gw = glyphs.shape
+    if len(bounds) == 0:
+        return np.zeros((0, n))
+    bd = np.array(bounds, dtype=np.float64)
+
+    # Sample positions, with the arithmetic of the per-pixel version
+    sc = (bd[:, 3] - bd[:, 1]) / 100.0
+    xp = np.minimum((np.arange(gw) * sc[:, None] + bd[:, 0:1]).astype(int),
+                    w - 1)
+    yp = np.minimum((np.arange(gh) * sc[:, None] + bd[:, 1:2]).astype(int),
+                    h - 1)
+    samples = mask[yp[:, :, None], xp[:, None, :]]
+    inside = np.broadcast_to((xp < bd[:, 2:3])[:, None, :], samples.shape)
+
+    # Stack the areas and the glyphs as matrices of flattened pixels
+    samples = samples.reshape(len(bd), -1)
+    inside = inside.reshape(len(bd), -1)
+    glyphs = glyphs.reshape(n, -1)
+    lit = (samples & inside).astype(np.float32)
+    dark = (~samples & inside).astype(np.float32)
+    outside = (~inside).astype(np.float32)
+
+    same = lit.dot((glyphs == 255).T.astype(np.float32)) + \
+        dark.dot((glyphs == 0).T.astype(np.float32))
+    spill = outside.dot((glyphs != 0).T.astype(np.float32))
+    return 2 * same - inside.sum(axis=1)[:, None] - spill
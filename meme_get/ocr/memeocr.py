@@ -5,62 +5,33 @@ from builtins import range
 from past.utils import old_div
 import random
 import json
-import sys
-import os
-import enchant
-import pyocr
-import pyocr.builders
-from PIL import Image, ImageDraw, ImageFont
+import threading
+import numpy as np
+from PIL import Image, ImageDraw
+from .threshold import threshold
+from .components import label
+from .glyphs import C, FONT, templates, match
+from .tesseract import default_backend
+from . import preprocess as _preprocess
 
 path = "images/img8.jpg"
 
-# characters to recognize
-C = "ABCDEFGHIJKLMNOPQRSTUVWXYZ123456789"
-
-# standard character glyphs
-cimgs = []
-
-# original image
-IM = None
-w, h = 0, 0
-PX = None
-
-# display layer
-disp = None
-draw = None
-
-# threshold layer
-thim = None
-thpx = None
-thdr = None
-
-# character areas
-areas = []
-badareas = []
+# largest number of pixels in a character area. The flood fill that used
+# to find areas gave up after 30000 steps, which is five per pixel.
+MAXAREA = 6000
 
 
 def loadimg(path):
-    global IM, w, h, PX, disp, draw, thim, thpx, thdr
-    # original image
-    IM = Image.open(path)
-    w, h = IM.size
-    PX = IM.load()
-
-    # display layer
-    disp = Image.new("RGB", (w, h))
-    draw = ImageDraw.Draw(disp)
-
-    # threshold layer
-    thim = Image.new("RGB", (w, h))
-    thpx = thim.load()
-    thdr = ImageDraw.Draw(thim)
-
-def closeimg():
-    """ Close all the image
+    """ Load an image into memory
+
+    :param path: A file name or file-like object
+    :return: The decoded image
+    :rtype: PIL.Image.Image
     """
-    IM.close()
-    disp.close()
-    thim.close()
+    im = Image.open(path)
+    im.load()
+    return im
+
 
 # rgb(255,255,255) to hsv(360,1.0,1.0) conversion
 def rgb2hsv(r, g, b):
@@ -86,141 +57,85 @@ def rgb2hsv(r, g, b):
     V = cmax
     return H, S, V
 
-# find the left cutoff of character glyph
-
-
-def firstwhitex(im):
-    fwx = im.size[0]
-    px = im.load()
-    for y in range(0, im.size[1]):
-        for x in range(0, im.size[0]):
-            r, g, b = px[x, y][:3]
-            if (r, g, b) == (255, 255, 255):
-                if x < fwx:
-                    fwx = x
-    return fwx
-
-# been there
-
-
-def visited(x, y, areas):
-    for i in range(0, len(areas)):
-        if (x, y) in areas[i]:
-            return True
-    return False
-
-# floodfill from pixel
-
-
-def flood(x, y, d):
-    global areas
-    area = []
-    seeds = [(x, y)]
-    while d > 0 and len(seeds) > 0:
-
-        d -= 1
-        if d == 0:
-            # print "too large"
+# get all character areas
+def getareas(mask, disp=None, bands=True):
+    """ Find the character areas of a thresholded image
+
+    :param mask: A 2D boolean array, True for text pixels
+    :param disp: If given, an RGB image to paint the areas on
+    :param bool bands: If True, only look for areas from the top and
+        bottom quarters of the image, else from the whole image
+    :return: The character areas and the areas too large to be characters
+    :rtype: tuple
+    """
+    h, w = mask.shape
+    # pixels on the image border are never part of an area
+    mask = mask.copy()
+    mask[0, :] = mask[-1, :] = False
+    mask[:, 0] = mask[:, -1] = False
+    labels, components = label(mask)
+
+    # look for areas from every 5th pixel of every 10th row of the top
+    # and bottom quarters, keeping them in the order they are found
+    if bands:
+        rows = list(range(0, int(old_div(h, 4)), 10)) + \
+            list(range(int(3 * h / 4), h, 10))
+    else:
+        rows = list(range(0, h, 5))
+    seeds = labels[rows, ::5].ravel()
+    found, first = np.unique(seeds, return_index=True)
+
+    areas = []
+    badareas = []
+    for l in found[np.argsort(first)]:
+        if l == 0:
+            continue
+        area = components[l - 1]
+        if area.size >= MAXAREA:
             badareas.append(area)
-            return []
-        x, y = seeds.pop()
-
-        if visited(x, y, areas) or visited(x, y, badareas):
-            # print "visited"
-            return []
-
-        if (d > 0 and x > 0 and x < w - 1 and y > 0 and y < h - 1):
-            if not((x, y) in area):
-                r, g, b = thpx[x, y][:3]
-
-                if (r != 0):
-                    area.append((x, y))
-                    seeds += [(x, y), (x - 1, y), (x, y - 1),
-                              (x + 1, y), (x, y + 1)]
-    return area
+        elif area.size > 1:
+            areas.append(area)
 
-
-# get all character areas
-def getareas():
-    for y in list(range(0, int(old_div(h, 4)), 10)) + list(range(int(3 * h / 4), h, 10)):
-        print(y, "/", h)
-        for x in range(0, w, 5):
-            area = flood(x, y, 30000)
-            # print area
-            if len(area) > 1:
-                col = (random.randrange(0, 255), random.randrange(
-                    0, 255), random.randrange(0, 255))
-                for i in range(0, len(area)):
-                    draw.point(list(area[i]), fill=col)
-                areas.append(area)
+    if disp is not None:
+        palette = np.zeros((len(components) + 1, 3), dtype=np.uint8)
+        for area in areas:
+            palette[area.label] = (random.randrange(0, 255), random.randrange(
+                0, 255), random.randrange(0, 255))
+        disp.paste(Image.fromarray(palette[labels]))
+    return areas, badareas
 
 # boundaries of a character
 
 
 def getbounds(area):
-    xmin = area[0][0]
-    xmax = area[0][0]
-    ymin = area[0][1]
-    ymax = area[0][1]
-    for i in range(0, len(area)):
-        if area[i][0] < xmin:
-            xmin = area[i][0]
-        if area[i][1] < ymin:
-            ymin = area[i][1]
-        if area[i][0] > xmax:
-            xmax = area[i][0]
-        if area[i][1] > ymax:
-            ymax = area[i][1]
+    xmin, ymin, xmax, ymax = area.bounds
     return xmin - 1, ymin - 1, xmax + 1, ymax + 1
 
 # draw a boundary
 
 
-def drawbounds():
+def drawbounds(areas, draw=None):
     bds = []
     for i in range(0, len(areas)):
         bd = getbounds(areas[i])
         bds.append(bd)
-        draw.rectangle(bd, outline=(255, 0, 0))
+        if draw is not None:
+            draw.rectangle(bd, outline=(255, 0, 0))
     return bds
 
 
 # OCR
-def checkchars():
+def checkchars(mask, bds, glyphs, charset=C, draw=None):
     scoreboard = []
-    for i in range(0, len(areas)):
-        print(i, "/", len(areas))
-        bd = getbounds(areas[i])
-        scores = []
-        
-        print(len(cimgs))
-
-        for j in range(0, len(cimgs)):
-            score = 0
-            px = cimgs[j].load()
-            score = 0
-            sc = old_div((1.0 * (bd[3] - bd[1])), 100.0)
-            for x in range(0, cimgs[j].size[0]):
-                for y in range(0, cimgs[j].size[1]):
-                    xp = min(int(x * sc + bd[0]), w - 1)
-                    yp = min(int(y * sc + bd[1]), h - 1)
-
-                    r1, g1, b1 = px[x, y][:3]
-                    r2, g2, b2 = thpx[xp, yp][:3]
-
-                    if (xp < bd[2]):
-                        if (r1 == r2):
-                            score += 1
-                        else:
-                            score -= 1
-                    else:
-                        if (r1 == 0):
-                            score += 0
-                        else:
-                            score -= 1
-            scores.append((C[j], old_div(int(score * 10), 10.0)))
+    board = match(mask, bds, glyphs)
+    for i in range(0, len(bds)):
+        bd = bds[i]
+        scores = [(charset[j], float(board[i, j]))
+                  for j in range(0, len(charset))]
         scoreboard.append(normalize(scores))
-        draw.text((bd[0], bd[1] - 5), normalize(scores)[0][0], (0, 255, 255))
+        if draw is not None:
+            draw.text((bd[0], bd[1] - 5), scoreboard[-1][0][0],
+                      (0, 255, 255))
     return scoreboard
 
 
@@ -247,129 +162,264 @@ def showresult(scoreboard):
     for i in range(0, len(scoreboard)):
         print("".join([s[0] for s in scoreboard[i]]))
 
-# make character glyphs
+# make threshold image
 
 
-def makeglyphs():
+def thresh(im):
+    """ Threshold an image for OCR
 
-    for i in range(0, len(C)):
-        im = Image.new("RGB", (100, 110))
-        dr = ImageDraw.Draw(im)
-        font = ImageFont.truetype(os.path.join(os.path.dirname(__file__),"fonts/Impact.ttf"), 124)
-        dr.text((0, -25), C[i], (255, 255, 255), font=font)
+    :return: The thresholded image, white text on black, and its mask
+    :rtype: tuple
+    """
+    thim = threshold(im)
+    return thim, np.asarray(thim) != 0
 
-        fwx = firstwhitex(im)
 
-        im = Image.new("RGB", (100, 110))
-        dr = ImageDraw.Draw(im)
-        font = ImageFont.truetype(os.path.join(os.path.dirname(__file__),"fonts/Impact.ttf"), 124)
-        dr.text((-fwx, -26), C[i], (255, 255, 255), font=font)
+class OcrImage(object):
+    """ An image and the layers derived from it, shared by OCR engines
 
-        cimgs.append(im)
+    The image is decoded on first use, and the thresholded image and text
+    mask are computed on first use, once for all the engines that process
+    the image, from any thread. Engines must not close the layers.
 
-# make threshold image
+    An image can be preprocessed, see
+    :class:`meme_get.ocr.preprocess.Preprocess`. Every engine, FontMatching
+    and Tesseract alike, then reads the preprocessed image and the layers
+    derived from it, and the decoded image is freed once preprocessed.
 
+    **Attributes:**
+        * source: The file name or file-like object of the image
+        * preprocess: The Preprocess settings, or None
+        * cropped (bool): Whether the image was cropped to its captions,
+          known once it is decoded
+    """
 
-def thresh():
-    for x in range(0, w):
-        for y in range(0, h):
-            r, g, b = PX[x, y][:3]
-            hsv = rgb2hsv(r, g, b)
-            if (hsv[2] > 0.9)and hsv[1] < 0.1:
-                thdr.point([x, y], fill=(255, 255, 255))
-            else:
-                thdr.point([x, y], fill=(0, 0, 0))
+    def __init__(self, source, preprocess=None):
+        self.source = source
+        self.preprocess = preprocess
+        self.cropped = False
+        self._image = None
+        self._thim = None
+        self._mask = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def image(self):
+        """ The decoded image, preprocessed if there are preprocess
+        settings
+
+        :rtype: PIL.Image.Image
+        """
+        with self._lock:
+            return self._decode()
+
+    def threshold(self):
+        """ The thresholded image, white text on black
+
+        :rtype: PIL.Image.Image
+        """
+        with self._lock:
+            self._threshold()
+            return self._thim
+
+    def mask(self):
+        """ The text mask of the thresholded image
+
+        :rtype: numpy.ndarray
+        """
+        with self._lock:
+            self._threshold()
+            return self._mask
+
+    def close(self):
+        """ Free the decoded image and its layers
+        """
+        with self._lock:
+            for im in [self._image, self._thim]:
+                if im is not None:
+                    im.close()
+            self._image = self._thim = self._mask = None
+            self._closed = True
+
+    def _decode(self):
+        if self._closed:
+            raise ValueError("The OcrImage is closed.")
+        if self._image is None:
+            if hasattr(self.source, "seek"):
+                self.source.seek(0)
+            im = loadimg(self.source)
+            if self.preprocess is not None:
+                prepared, self.cropped = self.preprocess.apply(im)
+                if prepared is not im:
+                    im.close()
+                im = prepared
+            self._image = im
+        return self._image
+
+    def _threshold(self):
+        if self._thim is None:
+            self._thim, self._mask = thresh(self._decode())
+
+    def __str__(self):
+        return str(self.source)
+
+
+def ocrimage(path, preprocess=None):
+    """ The OcrImage of a file, and whether the caller must close it
+
+    :param path: A file name, file-like object or OcrImage
+    :param preprocess: The Preprocess settings of a new OcrImage
+    :rtype: tuple
+    """
+    if isinstance(path, OcrImage):
+        return path, False
+    return OcrImage(path, preprocess), True
 
-# returns possible characters and bounds in an image
 
+class OcrResult(object):
+    """ The characters found in an image by FontMatching OCR
 
-def rawocr(path):
-    global cimgs
-    print("Starting ocr for {}".format(str(path)))
-    # Clear glyphs
-    cimgs = []
+    **Attributes:**
+        * bounds (list): (xmin, ymin, xmax, ymax) boundaries of the
+          character areas, in the order they were found
+        * scoreboard (list): For every area, a list of (character, score)
+          pairs from the best match to the worst
+        * display (PIL.Image.Image): In debug mode, the areas, their
+          bounds and best characters drawn on a black image; else None
+    """
 
-    loadimg(path)
-    print("p0: ", len(cimgs))
-    makeglyphs()
+    def __init__(self, bounds, scoreboard, display=None):
+        self.bounds = bounds
+        self.scoreboard = scoreboard
+        self.display = display
 
-    print("p1: ", len(cimgs))
-    thresh()
-    # thim.show()
-    getareas()
-    bds = drawbounds()
+    def caption(self, simple=False, debug=False):
+        """ Guess the caption from the characters found
 
-    # disp.show()
-    print("p2: ", len(cimgs))
+        :param bool simple: If True, only use the best match of every
+            character instead of searching for dictionary words
+        :param bool debug: If True, print the raw lines
+        :return: The caption, one line of text per line
+        :rtype: str
+        """
+        from . import parse
+        return parse.guesscaption(self.bounds, self.scoreboard, simple,
+                                  debug=debug)
 
-    ccr = checkchars()
-    showresult(ccr)
-    # disp.show()
-    closeimg()
-    print("Finish OCR.")
-    return bds, ccr
+
+class OcrEngine(object):
+    """ OCR on meme images
+
+    An engine only holds read-only data such as the character glyphs;
+    everything about an image lives in the call that processes it. One
+    engine can therefore serve many images, including from several
+    threads at once.
+    """
+
+    def __init__(self, charset=C, font=FONT, backend=None, debug=False,
+                 preprocess=_preprocess.DEFAULT):
+        """ __init__ method for OcrEngine class
+
+        :param str charset: The characters FontMatching can recognize
+        :param str font: Path to the TrueType font of the captions
+        :param backend: The TesseractBackend to use, by default the one
+            shared by the process
+        :param bool debug: If True, print progress and draw what
+            FontMatching finds on the display layer of its results
+        :param preprocess: The Preprocess settings applied to the images
+            the engine opens, for FontMatching and Tesseract alike, or None
+            to use them as they are. By default large images are scaled
+            down and cropped to their captions.
+        """
+        self._debug = debug
+        self._preprocess = preprocess
+        self._charset = charset
+        self._glyphs = templates(charset, font)
+        self._backend = backend if backend is not None else \
+            default_backend()
+
+    def rawocr(self, path):
+        """ Find the possible characters and bounds in an image
+
+        :param path: A file name, file-like object or OcrImage
+        :rtype: OcrResult
+        """
+        if self._debug:
+            print("Starting ocr for {}".format(str(path)))
+        image, owned = ocrimage(path, self._preprocess)
+        try:
+            mask = image.mask()
+
+            # display layer, only drawn on for debugging
+            disp = draw = None
+            if self._debug:
+                disp = Image.new("RGB", image.image().size)
+                draw = ImageDraw.Draw(disp)
+
+            areas, badareas = getareas(mask, disp, not image.cropped)
+            bds = drawbounds(areas, draw)
+            ccr = checkchars(mask, bds, self._glyphs, self._charset, draw)
+        finally:
+            if owned:
+                image.close()
+
+        if self._debug:
+            showresult(ccr)
+            print("Finish OCR.")
+        return OcrResult(bds, ccr, disp)
+
+    def ocr(self, path, simple=False):
+        """ FontMatching OCR
+
+        :param path: A file name, file-like object or OcrImage
+        :return: The caption of the image
+        :rtype: str
+        """
+        return self.rawocr(path).caption(simple, self._debug)
+
+    def tesseract(self, path, thres=False, cfg="Default", spellcheck=True):
+        """ Tesseract OCR
+
+        :param path: A file name, file-like object or OcrImage
+        :param bool thres: Whether to threshold the image first
+        :param str cfg: The Tesseract configuration to use
+        :param bool spellcheck: Whether to correct the spelling of the
+            text found
+        :return: The caption of the image
+        :rtype: str
+        """
+        image, owned = ocrimage(path, self._preprocess)
+        try:
+            im = image.threshold() if thres else image.image()
+            return self._backend.ocr(im, cfg, spellcheck)
+        finally:
+            if owned:
+                image.close()
+
+
+# returns possible characters and bounds in an image
+def rawocr(path):
+    result = OcrEngine().rawocr(path)
+    return result.bounds, result.scoreboard
 
 
 def tesseract_ocr_helper(base_image, config="Default"):
     """ A wrapper for using tesseract to do OCR
     """
-    tools = pyocr.get_available_tools()
-    if len(tools) == 0:
-        print("No OCR tool found")
-        sys.exit(1)
-
-    # The tools are returned in the recommended order of usage
-    tool = tools[0]
-    print("Will use tool '%s'" % (tool.get_name()))
-
-    langs = tool.get_available_languages()
-    print("Available languages: %s" % ", ".join(langs))
-    lang = langs[0]
-    print("Will use lang '%s'" % (lang))
-
-    custom_builder = pyocr.builders.TextBuilder()
-    if config != "Default":
-        custom_builder.tesseract_configs = [config]
-
-    txt = tool.image_to_string(
-        base_image,
-        lang=lang,
-        builder=custom_builder
-    )
-
-    # Spell correct
-    dict_path = os.path.join(os.path.dirname(__file__),"dict/urban_dict.txt")
-    d = enchant.DictWithPWL("en_US", dict_path)
-    txtA = txt.replace('\n', ' \n ')
-    A = txtA.split(" ")
-    B = []
-
-    for x in A:
-        if (x != '\n' and len(x) != 0
-                and d.check(x) is False
-                and len(d.suggest(x)) != 0):
-            B.append(d.suggest(x)[0])
-        else:
-            B.append(x)
+    return default_backend().ocr(base_image, config)
 
-    return " ".join(B)
 
-
-def tesseract_ocr(path, thres=False, cfg="Default"):
+def tesseract_ocr(path, thres=False, cfg="Default", spellcheck=True):
     """ Wrapper for tesseract OCR
     """
-    loadimg(path)
-    if thres:
-        thresh()
-        result = tesseract_ocr_helper(thim, config=cfg)
-        return result
-    else:
-        result = tesseract_ocr_helper(IM, config=cfg)
-        return result
+    return OcrEngine().tesseract(path, thres=thres, cfg=cfg,
+                                 spellcheck=spellcheck)
 
 
 if __name__ == "__main__":
-    bds, ccr = rawocr(path)
+    result = OcrEngine(debug=True).rawocr(path)
+    bds, ccr = result.bounds, result.scoreboard
+    result.display.show()
 
     js = json.dumps([bds, ccr])
     fo = open("data/" + path.split("/")[-1].split(".")[0] + ".json", "w")
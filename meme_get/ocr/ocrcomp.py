@@ -5,18 +5,27 @@ from __future__ import print_function
 from __future__ import division
 from builtins import range
 from past.utils import old_div
-import os
+import io
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from . import wordlist
 
-wl_path = os.path.join(os.path.dirname(__file__),"dict/linuxwords.txt")
-wl = open(wl_path, "r").read().upper().split("\n")
+AUTO_THRESHOLD = 0.8
+""" Score at which the Auto method stops waiting for other results.
+"""
+
+Candidate = namedtuple("Candidate", ["name", "caption", "score", "seconds"])
+""" The result of one OCR function: its name, the caption found, the
+score of the caption (see evalresult) and the seconds it took.
+"""
 
 def ocr(path):
     """ DIY OCR from scratch
     """
-    from .memeocr import rawocr
-    import meme_get.ocr.parse as parse
-    parse.bds, parse.ccr = rawocr(path)
-    return parse.guesscaption()
+    from .memeocr import OcrEngine
+    return OcrEngine().ocr(path)
 
 
 def ocrTesseract(path, thres=True, cfg="urban"):
@@ -26,19 +35,26 @@ def ocrTesseract(path, thres=True, cfg="urban"):
     return tesseract_ocr(path, thres=thres, cfg=cfg)
 
 
-def evalresult(t):
+def evalresult(t, debug=False):
     """ Evaluate the quality of an ocr result
+
+    :param str t: The text found by OCR
+    :param bool debug: If True, print the score
+    :return: The share of words found in the dictionary
+    :rtype: float
     """
     puncs = ".,!?"
     t = t.replace("\n", " ")
     for p in puncs:
         t = t.replace(p, " " + p)
     t = t.split(" ")
+    wl = wordlist.load()
     score = 0.0
     for i in range(0, len(t)):
         if t[i] in wl:
             score += 1.0
-    print(old_div(score, len(t)))
+    if debug:
+        print(old_div(score, len(t)))
     return old_div(score, len(t))
 
 def ocrcomp(path, *args):
@@ -46,5 +62,84 @@ def ocrcomp(path, *args):
     """
     results = []
     for f in args:
-        results.append((f, f(path)))
-    return sorted(results, key=lambda x: evalresult(x[1]), reverse=True)
\ No newline at end of file
+        t = f(path)
+        results.append((evalresult(t), f, t))
+    results = sorted(results, key=lambda x: x[0], reverse=True)
+    return [(f, t) for _, f, t in results]
+
+
+def best(path, candidates, threshold=AUTO_THRESHOLD, workers=None,
+         release=None):
+    """ Run ocr functions concurrently and keep the best result
+
+    Every result is scored once, as soon as it is ready. Once one scores
+    at least threshold, the others are not waited for; those already
+    running keep going in the background until they finish.
+
+    :param path: A file name, file-like object or memeocr.OcrImage. An
+        OcrImage is shared by all candidates, so that the picture is
+        decoded and thresholded only once.
+    :param list candidates: (name, function) pairs; each function takes
+        the path and returns a caption
+    :param float threshold: Score that ends the search early, or None to
+        always wait for every result
+    :param int workers: Number of threads, by default one per candidate
+    :param release: A function called once best has returned and every
+        candidate has finished, e.g. to close a shared OcrImage. It may
+        be called from a worker thread.
+    :return: The best result; ties go to the earlier candidate
+    :rtype: Candidate
+    :raises Exception: the first error, if every candidate failed
+    """
+    # Every thread reads the picture from its own file object
+    if hasattr(path, "read"):
+        path.seek(0)
+        data = path.read()
+    else:
+        data = None
+
+    def run(name, f):
+        start = time.time()
+        t = f(io.BytesIO(data) if data is not None else path)
+        return Candidate(name, t, evalresult(t), time.time() - start)
+
+    # Users of the path: best itself and every candidate submitted
+    users = [1]
+    users_lock = threading.Lock()
+
+    def finished(future=None):
+        with users_lock:
+            users[0] -= 1
+            last = users[0] == 0
+        if last and release is not None:
+            release()
+
+    executor = ThreadPoolExecutor(max_workers=workers or len(candidates))
+    futures = {}
+    try:
+        for i, (name, f) in enumerate(candidates):
+            future = executor.submit(run, name, f)
+            with users_lock:
+                users[0] += 1
+            future.add_done_callback(finished)
+            futures[future] = i
+        results = []
+        errors = []
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as err:
+                errors.append(err)
+                continue
+            results.append((futures[future], result))
+            if threshold is not None and result.score >= threshold:
+                return result
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+        finished()
+
+    if len(results) == 0:
+        raise errors[0]
+    return max(results, key=lambda x: (x[1].score, -x[0]))[1]
\ No newline at end of file
@@ -3,91 +3,114 @@ from __future__ import division
 from builtins import range
 from past.utils import old_div
 import json
-import itertools
-import meme_get.ocr.util as util
+from collections import namedtuple
+from meme_get.ocr import wordlist
 import warnings
-import os
+import sys
 
+# The raw ocr data is passed to every function: bds holds the bounds of
+# the character areas and ccr their character scores, as returned by
+# memeocr.rawocr()
 
-# loads raw ocr data
-#path = "images/img5.jpg"
-# fi = open("data/" + path.split("/")[-1].split(".")[0] + ".json", "r")
-#js = json.loads(fi.read())
-bds = None
-ccr = None
-#bds = js[0]
-#ccr = js[1]
+# Max number of partial words guessword tries for one word
+MAX_CANDIDATES = 20000
 
-# dictionary
-#wl = open("dict/linuxwords.txt", "r").read().upper().split("\n")
 
-wl_path = os.path.join(os.path.dirname(__file__),"dict/linuxwords.txt")
-wl = open(wl_path, "r").read().upper().split("\n")
+Line = namedtuple("Line", ["bounds", "words"])
+""" A line of text: its (xmin, ymin, xmax, ymax) bounds and its words,
+left to right.
+"""
 
+Word = namedtuple("Word", ["chars", "mark"])
+""" A word of a line: its characters, either indices into ccr or literal
+characters, or a punctuation mark ("?" or "!") standing alone.
+"""
 
-# format raw ocr data
-def guessformat():
-    result = ""
+
+# group character areas into lines
+def findlines(bds):
+    # Areas are swept from the top down, so an area is only compared
+    # with the line being built: it joins the line if it is within 5
+    # pixels of its mean top (floored for integer bounds, as before),
+    # else it starts the next line.
     lines = []
-    for i in range(0, len(bds)):
-        found = 0
-        for j in range(0, len(lines)):
-            if len(lines[j]) > 0:
-                if abs(bds[i][1] - old_div(sum([bds[l][1] for l in lines[j]]), len(lines[j]))) < 5:
-                    lines[j].append(i)
-                    found = 1
-                    break
-        if found == 0:
+    top = 0
+    for i in sorted(range(0, len(bds)), key=lambda k: bds[k][1]):
+        if len(lines) > 0 and \
+                abs(bds[i][1] - old_div(top, len(lines[-1]))) < 5:
+            lines[-1].append(i)
+            top += bds[i][1]
+        else:
             lines.append([i])
+            top = bds[i][1]
 
     for i in range(0, len(lines)):
         lines[i] = sorted(lines[i], key=lambda x: bds[x][0])
-    lines = sorted(lines, key=lambda x: bds[x[0]][1])
-
-    for j in range(0, len(lines)):
-        l = lines[j]
-        nl = []
-        for i in range(0, len(l)):
-            nl.append(l[i])
-            if i < len(l) - 1:
-                if bds[l[i + 1]][0] - bds[l[i]][2] > 0.3 * sum([bds[k][2] - bds[k][0] for k in l]) / len(l):
-                    nl.append(" ")
-            if bds[l[i]][3] - bds[l[i]][1] < 0.5 * sum([bds[k][3] - bds[k][1] for k in l]) / len(l):
-                nl.pop()
-                nl.append("'")
-            elif bds[l[i]][3] - bds[l[i]][1] < 0.9 * sum([bds[k][3] - bds[k][1] for k in l]) / len(l):
-                nl.pop()
-                if ccr[l[i]][0][0] == "I" or ccr[l[i]][0][0] == "J":
-                    nl.append("!")
-                else:
-                    nl.append("?")
-        lines[j] = nl
+    return sorted(lines, key=lambda x: bds[x[0]][1])
+
+
+# split the characters of a line into words
+def splitwords(l, bds, ccr):
+    n = len(l)
+    width = sum([bds[k][2] - bds[k][0] for k in l])
+    height = sum([bds[k][3] - bds[k][1] for k in l])
+
+    # Wide gaps are spaces, short characters are punctuation. A mark
+    # replaces the space appended after its character, or the character
+    # itself when no space follows it.
+    nl = []
+    for i in range(0, n):
+        nl.append(l[i])
+        if i < n - 1:
+            if bds[l[i + 1]][0] - bds[l[i]][2] > 0.3 * width / n:
+                nl.append(" ")
+        if bds[l[i]][3] - bds[l[i]][1] < 0.5 * height / n:
+            nl.pop()
+            nl.append("'")
+        elif bds[l[i]][3] - bds[l[i]][1] < 0.9 * height / n:
+            nl.pop()
+            if ccr[l[i]][0][0] == "I" or ccr[l[i]][0][0] == "J":
+                nl.append("!")
+            else:
+                nl.append("?")
+
+    words = [Word([], None)]
+    for c in nl:
+        if c == " ":
+            words.append(Word([], None))
+        elif c == "?" or c == "!":
+            words.append(Word([], c))
+        elif words[-1].mark is None:
+            words[-1].chars.append(c)
+        else:
+            words.append(Word([c], None))
+    return words
 
+
+# format raw ocr data
+def guessformat(bds, ccr):
+    lines = []
+    for l in findlines(bds):
+        bounds = (min([bds[k][0] for k in l]), min([bds[k][1] for k in l]),
+                  max([bds[k][2] for k in l]), max([bds[k][3] for k in l]))
+        lines.append(Line(bounds, splitwords(l, bds, ccr)))
     return lines
 
 
 # guess a line of text
-def guessline(line, simple=False):
-    words = [[]]
-    for i in line:
-        if i == " ":
-            words.append([])
-        elif i == "?" or i == "!":
-            words.append(i)
+def guessline(line, ccr, simple=False, budget=MAX_CANDIDATES):
+    words = []
+    for w in line.words:
+        if w.mark is not None:
+            words.append(w.mark)
         else:
-            if type(words[-1]) == list:
-                words[-1].append(i)
-            else:
-                words.append([i])
-    for i in range(0, len(words)):
-        if type(words[i]) == list:
-            words[i] = guessword(words[i], simple)
+            words.append(guessword(w.chars, ccr, simple, budget))
     return " ".join(words)
 
 # sort possible corrections
 
 
-def sortchange(word):
+def sortchange(word, ccr):
     changes = []
     for w in word:
         if type(w) == int:
@@ -98,11 +121,27 @@ def sortchange(word):
     return changes
 
 
+# position of a choice of changes in the order of util.allchoice
+def choicerank(choice, sizes):
+    """ Index of a choice of changes in util.allchoice order
+
+    :param dict choice: The chosen change of each used group, by group
+    :param list sizes: The number of changes in every group
+    :rtype: int
+    """
+    key = 0
+    total = 1
+    for j in range(0, len(sizes)):
+        if j in choice:
+            key = total + key * sizes[j] + choice[j]
+        total *= 1 + sizes[j]
+    return key
+
+
 # guess a word
-def guessword(w, simple=False):
+def guessword(w, ccr, simple=False, budget=MAX_CANDIDATES):
     word = w[:]
-    changes = {}
-    pot = sortchange(word)
+    pot = sortchange(word, ccr)
 
     guess = ""
     for i in range(0, len(word)):
@@ -117,34 +156,61 @@ def guessword(w, simple=False):
     if simple:
         return guess0
 
-    def ind(word, i):
-        for j in range(0, len(word)):
-            if word[j][0] == i:
-                return j
-        return -1
+    wl = wordlist.load()
+    if guess in wl:
+        return guess
 
-    while guess not in wl:
-        if len(pot) == 0 or pot[-1][1][1] < 0.8:
-            return guess0
+    # Changes are added one at a time, best score first. After each one the
+    # first dictionary word in util.allchoice order is looked for, but only
+    # among the choices using the new change (all others failed before) and
+    # only along prefixes of dictionary words. Past the budget, give up.
+    changes = []
+    group = {}
+    spent = 0
+    while len(pot) > 0 and pot[-1][1][1] >= 0.8:
         nc = pot.pop()
-        if nc[0] not in list(changes.keys()):
-            changes[nc[0]] = []
-        changes[nc[0]].append(nc)
-
-        chco = util.allchoice(list(changes.values()))
-
-        for c in chco:
-            newword = word[:]
-            for d in c:
+        if nc[0] not in group:
+            group[nc[0]] = len(changes)
+            changes.append([])
+        changes[group[nc[0]]].append(nc[1][0])
+        sizes = [len(c) for c in changes]
+
+        best = None
+        stack = [(0, "", {})]
+        while len(stack) > 0:
+            pos, prefix, choice = stack.pop()
+            if pos == len(word):
+                if prefix in wl:
+                    rank = choicerank(choice, sizes)
+                    if best is None or rank < best[0]:
+                        best = (rank, prefix)
+                continue
+
+            spent += 1
+            if spent > budget:
+                return guess0
+
+            i, c = word[pos]
+            if i == nc[0]:
+                options = [(sizes[group[i]] - 1, nc[1][0])]
+            elif i in group:
+                options = [(None, c)] + list(enumerate(changes[group[i]]))
+            else:
+                options = [(None, c)]
 
-                newword[ind(newword, d[0])] = (d[0], d[1][0])
+            for e, ch in options:
+                if wl.has_prefix(prefix + ch):
+                    if e is None:
+                        stack.append((pos + 1, prefix + ch, choice))
+                    else:
+                        nchoice = dict(choice)
+                        nchoice[group[i]] = e
+                        stack.append((pos + 1, prefix + ch, nchoice))
 
-            guess = "".join([w[1] for w in newword])
-            # print guess
-            if guess in wl:
-                return guess
+        if best is not None:
+            return best[1]
 
-    return guess
+    return guess0
 
 # check if some text is noise
 
@@ -162,23 +228,28 @@ def isgibber(t):
 # guess the caption of a meme
 
 
-def guesscaption(simple=False):
+def guesscaption(bds, ccr, simple=False, budget=MAX_CANDIDATES,
+                 debug=False):
     output = ""
-    gf = guessformat()
+    gf = guessformat(bds, ccr)
 
-    print("raw: ")
-    for g in gf:
-        print(guessline(g, True))
-    print()
+    if debug:
+        print("raw: ")
+        for g in gf:
+            print(guessline(g, ccr, True))
+        print()
 
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
         for g in gf:
-            gl = guessline(g, simple=simple)
+            gl = guessline(g, ccr, simple=simple, budget=budget)
             if not isgibber(gl):
                 output += gl.replace(" !", "!").replace(" ?", "?") + "\n"
 
     return output
 
 if __name__ == "__main__":
-    print(guesscaption())
+    # loads raw ocr data saved by memeocr
+    fi = open(sys.argv[1], "r")
+    bds, ccr = json.loads(fi.read())
+    print(guesscaption(bds, ccr, debug=True))
@@ -0,0 +1,170 @@
+""" Preprocessing Module
+
+Meme captions are big lines of text at the top and the bottom of a
+picture, so large pictures can be scaled down and cropped to their
+caption bands before OCR without losing the text. The caption lines are
+found from the density of caption-coloured pixels in every row of a
+small copy of the picture.
+
+Both FontMatching and Tesseract read the preprocessed picture, see
+:class:`meme_get.ocr.memeocr.OcrImage`.
+"""
+
+from __future__ import division
+import numpy as np
+from PIL import Image
+from .threshold import textmask
+
+TEXT_HEIGHT = 48
+""" Default height in pixels that caption lines are scaled down to.
+"""
+
+BAND = 0.25
+""" Default share of the picture height searched for captions, at the top
+and at the bottom.
+"""
+
+MIN_HEIGHT = 600
+""" Default height in pixels below which pictures are used as they are.
+"""
+
+MAX_SHRINK = 4
+""" Default max factor pictures are scaled down by.
+"""
+
+# detection is done on a copy of the picture at most this many rows high
+_DETECT_HEIGHT = 400
+# a row is part of a text line if this share of its pixels is text
+_DENSITY = 0.02
+# text lines shorter than this share of the picture height are noise
+_MIN_LINE = 0.025
+# bands taller than this share of the picture height are not text lines,
+# e.g. the white header of a picture with black text
+_MAX_LINE = 0.15
+
+
+def textlines(image, band=BAND):
+    """ Find the rows of the caption lines of a picture
+
+    :param image: A PIL image
+    :param float band: Share of the picture height searched at the top
+        and at the bottom
+    :return: The (top, bottom) rows of every line found, bottom excluded,
+        from top to bottom
+    :rtype: list
+    """
+    w, h = image.size
+    step = max(1, int(np.ceil(h / _DETECT_HEIGHT)))
+    small = image.resize((max(1, w // step), max(1, h // step)),
+                         Image.NEAREST)
+    rows = textmask(small).mean(axis=1) > _DENSITY
+    # close gaps of one row inside a line
+    rows[1:-1] |= rows[:-2] & rows[2:]
+    edges = np.flatnonzero(np.diff(np.concatenate(
+        [[0], rows.astype(np.int8), [0]])))
+    lines = [(a * step, min(h, b * step))
+             for a, b in zip(edges[::2], edges[1::2])]
+
+    top, bottom = band * h, (1 - band) * h
+    return [(a, b) for a, b in lines
+            if _MIN_LINE * h <= b - a <= _MAX_LINE * h and
+            (a < top or b > bottom)]
+
+
+class Preprocess(object):
+    """ Settings of the preprocessing done before OCR
+
+    **Attributes:**
+        * text_height (int): Height that caption lines taller than it are
+          scaled down to, or None to keep the size
+        * max_shrink (float): Max factor pictures are scaled down by
+        * min_height (int): Pictures less high than this are used as they
+          are
+        * band (float): Share of the picture height kept at the top and at
+          the bottom when no caption lines are found
+        * detect (bool): Whether to crop to the caption lines found instead
+          of the fixed top and bottom bands
+        * crop (bool): Whether to crop at all
+    """
+
+    def __init__(self, text_height=TEXT_HEIGHT, band=BAND, detect=True,
+                 crop=True, min_height=MIN_HEIGHT, max_shrink=MAX_SHRINK):
+        self.text_height = text_height
+        self.max_shrink = max_shrink
+        self.min_height = min_height
+        self.band = band
+        self.detect = detect
+        self.crop = crop
+
+    def regions(self, image):
+        """ The row ranges of a picture to keep
+
+        :param image: A PIL image
+        :return: The (top, bottom) rows of the regions, and the height of
+            the shortest caption line or None if no lines were found
+        :rtype: tuple
+        """
+        w, h = image.size
+        lines = textlines(image, self.band) if self.detect else []
+        if len(lines) == 0:
+            height = None
+            spans = [(0, int(self.band * h)), (int((1 - self.band) * h), h)]
+        else:
+            height = min(b - a for a, b in lines)
+            # keep a margin of half a line around every line
+            spans = []
+            for a, b in lines:
+                margin = (b - a) // 2 + 1
+                spans.append((max(0, a - margin), min(h, b + margin)))
+
+        regions = []
+        for a, b in spans:
+            if not self.crop:
+                a, b = 0, h
+            if len(regions) > 0 and a <= regions[-1][1]:
+                regions[-1] = (regions[-1][0], max(b, regions[-1][1]))
+            else:
+                regions.append((a, b))
+        return regions, height
+
+    def apply(self, image):
+        """ Scale a picture down and crop it to its captions
+
+        The regions kept are stacked from top to bottom, separated by
+        black rows.
+
+        :param image: A PIL image
+        :return: The new image, or the same image if it is unchanged, and
+            whether it was cropped
+        :rtype: tuple
+        """
+        w, h = image.size
+        if h < self.min_height:
+            return image, False
+        regions, height = self.regions(image)
+        if regions != [(0, h)]:
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            gap = 4 if height is None else height // 4 + 1
+            out = Image.new("RGB", (w, sum(b - a for a, b in regions) +
+                                    gap * (len(regions) - 1)))
+            y = 0
+            for a, b in regions:
+                out.paste(image.crop((0, a, w, b)), (0, y))
+                y += b - a + gap
+            image, cropped = out, True
+        else:
+            cropped = False
+
+        if self.text_height is not None and height is not None and \
+                height > self.text_height:
+            scale = max(self.text_height / height, 1 / self.max_shrink)
+            w, h = image.size
+            image = image.resize((max(1, int(w * scale)),
+                                  max(1, int(h * scale))), Image.BILINEAR)
+        return image, cropped
+
+
+DEFAULT = Preprocess()
+""" The preprocessing done by default.
+"""
@@ -0,0 +1,171 @@
+""" Tesseract Module
+
+OCR through Tesseract (via pyocr), followed by an optional spell-correction
+stage using enchant and the urban dictionary. The OCR tool and the
+dictionary are set up once per backend and reused for every image.
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+import os
+import threading
+from collections import OrderedDict
+
+DICT_PATH = os.path.join(os.path.dirname(__file__), "dict/urban_dict.txt")
+""" Personal word list added to the enchant dictionary.
+"""
+
+CACHE_SIZE = 4096
+""" Default number of spelling corrections remembered by a backend.
+"""
+
+_default = None
+_default_lock = threading.Lock()
+
+
+class TesseractBackend(object):
+    """ A long-lived Tesseract OCR and spell-correction backend
+
+    The OCR tool, its language and the dictionary are found or loaded on
+    first use, so a backend is cheap to make. Spelling corrections are
+    memoized in a bounded LRU cache.
+
+    **Attributes:**
+        * _lang (str): The enchant dictionary language
+        * _dict_path (str): Path to the personal word list
+        * _cache_size (int): Max number of memoized corrections
+        * _debug (bool): Whether to print the tool and language found
+    """
+
+    def __init__(self, lang="en_US", dict_path=DICT_PATH,
+                 cache_size=CACHE_SIZE, debug=False):
+        self._debug = debug
+        self._lang = lang
+        self._dict_path = dict_path
+        self._cache_size = cache_size
+
+        self._tool = None
+        self._tool_lang = None
+        self._dict = None
+        self._corrections = OrderedDict()
+        self._setup_lock = threading.Lock()
+        self._dict_lock = threading.Lock()
+
+    def tool(self):
+        """ Find the OCR tool and its language, once
+
+        :return: The pyocr tool and the language it uses
+        :rtype: tuple
+        :raises RuntimeError: if no OCR tool is installed
+        """
+        with self._setup_lock:
+            if self._tool is None:
+                import pyocr
+                tools = pyocr.get_available_tools()
+                if len(tools) == 0:
+                    raise RuntimeError("No OCR tool found")
+
+                # The tools are returned in the recommended order of usage
+                tool = tools[0]
+                langs = tool.get_available_languages()
+                self._tool_lang = langs[0]
+                if self._debug:
+                    print("Will use tool '%s'" % (tool.get_name()))
+                    print("Available languages: %s" % ", ".join(langs))
+                    print("Will use lang '%s'" % (self._tool_lang))
+                self._tool = tool
+            return self._tool, self._tool_lang
+
+    def dictionary(self):
+        """ Load the spell-checking dictionary, once
+
+        :rtype: enchant.Dict
+        """
+        with self._setup_lock:
+            if self._dict is None:
+                import enchant
+                self._dict = enchant.DictWithPWL(self._lang, self._dict_path)
+            return self._dict
+
+    def recognize(self, image, config="Default"):
+        """ Read the text in an image with Tesseract
+
+        :param image: A PIL Image
+        :param str config: The Tesseract configuration to use
+        :return: The raw text found
+        :rtype: str
+        """
+        import pyocr.builders
+        tool, lang = self.tool()
+
+        custom_builder = pyocr.builders.TextBuilder()
+        if config != "Default":
+            custom_builder.tesseract_configs = [config]
+
+        return tool.image_to_string(image, lang=lang, builder=custom_builder)
+
+    def correct(self, text):
+        """ Replace misspelled words by their best suggestion
+
+        :param str text: The text to correct
+        :rtype: str
+        """
+        A = text.replace('\n', ' \n ').split(" ")
+        B = []
+        for x in A:
+            if x != '\n' and len(x) != 0:
+                B.append(self.correct_word(x))
+            else:
+                B.append(x)
+        return " ".join(B)
+
+    def correct_word(self, word):
+        """ The best suggestion for a misspelled word
+
+        :param str word: A single word
+        :return: The suggestion, or the word itself if it is spelled
+            correctly or there is no suggestion
+        :rtype: str
+        """
+        with self._dict_lock:
+            if word in self._corrections:
+                self._corrections[word] = self._corrections.pop(word)
+                return self._corrections[word]
+
+        d = self.dictionary()
+        with self._dict_lock:
+            result = word
+            if d.check(word) is False:
+                suggestions = d.suggest(word)
+                if len(suggestions) != 0:
+                    result = suggestions[0]
+
+            self._corrections[word] = result
+            if len(self._corrections) > self._cache_size:
+                self._corrections.popitem(last=False)
+        return result
+
+    def ocr(self, image, config="Default", spellcheck=True):
+        """ Read the text in an image and optionally correct its spelling
+
+        :param image: A PIL Image
+        :param str config: The Tesseract configuration to use
+        :param bool spellcheck: Whether to run the spell-correction stage
+        :rtype: str
+        """
+        txt = self.recognize(image, config)
+        if spellcheck:
+            txt = self.correct(txt)
+        return txt
+
+
+def default_backend():
+    """ Return the Tesseract backend shared by this process
+
+    :rtype: TesseractBackend
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = TesseractBackend()
+        return _default
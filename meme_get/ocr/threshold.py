@@ -0,0 +1,58 @@
+""" Thresholding Module
+
+Meme captions are set in white Impact type, so the caption text is found
+by keeping the bright and unsaturated pixels of a picture. The whole image
+is processed as arrays instead of pixel by pixel.
+"""
+
+from __future__ import division
+import numpy as np
+from PIL import Image
+
+# HSV limits of caption pixels: value above VMIN and saturation below SMAX
+VMIN = 0.9
+SMAX = 0.1
+
+
+def textmask(image):
+    """ Find the pixels of an image that look like caption text
+
+    This is the array version of converting every pixel with ``rgb2hsv``
+    and checking ``V > 0.9 and S < 0.1``. The hue is never needed, so it
+    is not computed.
+
+    :param image: The PIL image to threshold
+    :return: A (height, width) boolean array, True for caption pixels
+    :rtype: numpy.ndarray
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    rgb = np.asarray(image, dtype=np.float64) / 255.0
+    cmax = rgb.max(axis=2)
+    cmin = rgb.min(axis=2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sat = np.where(cmax == 0, 0.0, (cmax - cmin) / cmax)
+    return (cmax > VMIN) & (sat < SMAX)
+
+
+def threshold(image, invert=False, mode="L"):
+    """ Threshold an image into caption text and background
+
+    :param image: The PIL image to threshold
+    :param bool invert: If True, draw the text black on white instead of
+        white on black
+    :param str mode: The mode of the returned image, "L" or "1"
+    :return: The thresholded image
+    :rtype: PIL.Image.Image
+    :raises ValueError: if the mode is not supported
+    """
+    mask = textmask(image)
+    if invert:
+        mask = ~mask
+
+    if mode == "1":
+        return Image.fromarray(mask)
+    elif mode == "L":
+        return Image.fromarray(mask.astype(np.uint8) * 255)
+    else:
+        raise ValueError("Supported threshold modes: L, 1")
@@ -0,0 +1,72 @@
+""" Word List Module
+
+The dictionary used to check OCR results. It is read from disk once per
+process, on first use, and shared by every module that needs it.
+"""
+
+from __future__ import absolute_import
+import bisect
+import os
+import threading
+
+WL_PATH = os.path.join(os.path.dirname(__file__), "dict/linuxwords.txt")
+
+_wordlist = None
+_lock = threading.Lock()
+
+
+class WordList(object):
+    """ An upper case word list with fast lookups
+
+    Membership tests use a frozenset; prefix queries use a sorted tuple of
+    the words and binary search.
+    """
+
+    def __init__(self, words):
+        self._words = frozenset(words)
+        self._sorted = tuple(sorted(self._words))
+
+    def __contains__(self, word):
+        return word in self._words
+
+    def __len__(self):
+        return len(self._words)
+
+    def __iter__(self):
+        return iter(self._sorted)
+
+    def has_prefix(self, prefix):
+        """ Check whether any word starts with a prefix
+
+        :param str prefix: The prefix, in upper case
+        :rtype: bool
+        """
+        i = bisect.bisect_left(self._sorted, prefix)
+        return i < len(self._sorted) and self._sorted[i].startswith(prefix)
+
+    def with_prefix(self, prefix):
+        """ List the words starting with a prefix
+
+        :param str prefix: The prefix, in upper case
+        :return: The words in alphabetical order
+        :rtype: list
+        """
+        i = bisect.bisect_left(self._sorted, prefix)
+        result = []
+        while i < len(self._sorted) and self._sorted[i].startswith(prefix):
+            result.append(self._sorted[i])
+            i += 1
+        return result
+
+
+def load():
+    """ Return the shared word list, reading it on first use
+
+    :rtype: WordList
+    """
+    global _wordlist
+    with _lock:
+        if _wordlist is None:
+            with open(WL_PATH, "r") as f:
+                _wordlist = WordList(f.read().upper().split("\n"))
+        return _wordlist
@@ -0,0 +1,173 @@
+""" OCR Cache Module
+
+OCR is the most expensive thing meme_get does, so its results are kept in
+an SQLite database. A result is keyed by the content hash of the picture
+and the OCR settings, together with a version that changes whenever the
+OCR code, the dictionaries or the font change.
+
+The cache is off by default, so that the library does not write to disk
+unasked. Turn it on with :func:`set_default_cache`.
+"""
+
+from __future__ import absolute_import
+import contextlib
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+from .cachedir import cache_dir
+
+OCR_VERSION = 3
+""" Version of the OCR code. Bump it when a change alters OCR results.
+"""
+
+_OCR_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "ocr")
+
+RESOURCES = [os.path.join(_OCR_DIR, "dict", "linuxwords.txt"),
+             os.path.join(_OCR_DIR, "fonts", "Impact.ttf")]
+""" Files whose content affects OCR results.
+"""
+
+_SCHEMA = """CREATE TABLE IF NOT EXISTS results (
+    digest TEXT NOT NULL,
+    method TEXT NOT NULL,
+    thres TEXT NOT NULL,
+    cfg TEXT NOT NULL,
+    version TEXT NOT NULL,
+    caption TEXT NOT NULL,
+    PRIMARY KEY (digest, method, thres, cfg, version))"""
+
+_version = None
+_version_lock = threading.Lock()
+
+
+def version():
+    """ The version of OCR results
+
+    :return: A hash of OCR_VERSION and the content of the RESOURCES files
+    :rtype: str
+    """
+    global _version
+    with _version_lock:
+        if _version is None:
+            hashID = hashlib.sha1()
+            hashID.update(repr(OCR_VERSION).encode('utf-8'))
+            for path in RESOURCES:
+                if os.path.isfile(path):
+                    with open(path, 'rb') as f:
+                        hashID.update(f.read())
+            _version = hashID.hexdigest()
+        return _version
+
+
+def image_digest(image):
+    """ The content hash of a picture
+
+    :param image: The picture as bytes, a buffer, a file-like object or
+        a file path
+    :rtype: str
+    """
+    if isinstance(image, (bytes, bytearray, memoryview, mmap.mmap)):
+        data = image
+    elif hasattr(image, "read"):
+        pos = image.tell()
+        image.seek(0)
+        data = image.read()
+        image.seek(pos)
+    else:
+        with open(image, 'rb') as f:
+            data = f.read()
+    return hashlib.sha1(data).hexdigest()
+
+
+class OcrCache(object):
+    """ A persistent cache of OCR results
+
+    **Attributes:**
+        * _path (str): The path to the SQLite database
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(cache_dir("ocr"), "results.sqlite")
+        self._path = path
+
+        # Results of other versions can never be used again
+        with self._connect() as db:
+            db.execute(_SCHEMA)
+            db.execute("DELETE FROM results WHERE version != ?", (version(),))
+
+    def get(self, digest, method, thres=None, cfg=None):
+        """ Look up an OCR result
+
+        :param str digest: Content hash of the picture, see image_digest
+        :param str method: The OCR method
+        :param bool thres: Whether the picture was thresholded
+        :param str cfg: The Tesseract configuration
+        :return: The caption, or None if the result is not cached
+        :rtype: str
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT caption FROM results WHERE digest = ? "
+                             "AND method = ? AND thres = ? AND cfg = ? "
+                             "AND version = ?",
+                             self._key(digest, method, thres, cfg)).fetchone()
+        return row[0] if row is not None else None
+
+    def put(self, digest, method, thres, cfg, caption):
+        """ Save an OCR result
+
+        :param str caption: The caption found by OCR
+        """
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO results VALUES "
+                       "(?, ?, ?, ?, ?, ?)",
+                       self._key(digest, method, thres, cfg) + (caption,))
+
+    def clear(self):
+        """ Remove every result from the cache
+        """
+        with self._connect() as db:
+            db.execute("DELETE FROM results")
+
+    def _key(self, digest, method, thres, cfg):
+        return (digest, method, repr(thres), repr(cfg), version())
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """ Open the database for one transaction
+        """
+        db = sqlite3.connect(self._path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """ Return the OCR cache used by Meme.ocr_caption
+
+    :return: The default OcrCache, or None if caching is turned off,
+        which it is until set_default_cache is called
+    """
+    with _default_lock:
+        return _default
+
+
+def set_default_cache(cache):
+    """ Replace the OCR cache used by Meme.ocr_caption
+
+    Use ``set_default_cache(OcrCache())`` to keep the results in the
+    meme_get cache directory.
+
+    :param cache: An OcrCache, or None to always run OCR
+    """
+    global _default
+    with _default_lock:
+        _default = cache
@@ -0,0 +1,190 @@
+""" Parsers Module
+
+Turn the pages of meme sites into Meme objects. Parsing does no I/O, so
+the same code serves the blocking sites in :mod:`meme_get.memesites` and
+the asyncio ones in :mod:`meme_get.asyncsites`.
+
+quickmeme.com pages can be parsed by several HTML backends, which all
+give the same memes:
+
+* lxml: lxml.html, the fastest
+* strainer: BeautifulSoup, only building the post images
+* html.parser: BeautifulSoup with Python's HTML parser, the slowest
+
+By default the fastest one installed is used.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+import datetime
+import threading
+from builtins import str
+from .memesites import Meme, Origins
+
+QUICKMEME_PARSERS = ("lxml", "strainer", "html.parser")
+""" The HTML backends that can parse quickmeme.com pages, fastest first.
+"""
+
+_POST_CLASS = "post-image"
+_POST_XPATH = ("//*[contains(concat(' ', normalize-space(@class), ' '), "
+               "' {} ')]").format(_POST_CLASS)
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_parser():
+    """ The fastest HTML backend installed
+
+    :return: A name in QUICKMEME_PARSERS
+    :rtype: str
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            try:
+                import lxml.html  # noqa: F401
+                _default = "lxml"
+            except ImportError:
+                _default = "strainer"
+        return _default
+
+
+def _posts_lxml(text, n):
+    """ The (alt, src) attributes of the post images, using lxml
+    """
+    import lxml.etree
+    import lxml.html
+    if len(text.strip()) == 0:
+        return []
+    try:
+        doc = lxml.html.fromstring(text)
+    except ValueError:  # a unicode page with an encoding declaration
+        doc = lxml.html.fromstring(text.encode('utf-8'))
+    except lxml.etree.ParserError:  # nothing but whitespace or comments
+        return []
+    posts = doc.xpath(_POST_XPATH)
+    if n is not None:
+        posts = posts[:n]
+    return [(x.attrib['alt'], x.attrib['src']) for x in posts]
+
+
+def _is_post(classes):
+    """ Whether a class attribute, split or not, holds the post class
+
+    SoupStrainer sees the class attribute before it is split, so a plain
+    class_ filter misses posts with more than one class.
+    """
+    if classes is None:
+        return False
+    if not isinstance(classes, (list, tuple)):
+        classes = classes.split()
+    return _POST_CLASS in classes
+
+
+def _posts_soup(text, n, strainer):
+    """ The (alt, src) attributes of the post images, using BeautifulSoup
+    """
+    import bs4
+    if strainer:
+        only = bs4.SoupStrainer(class_=_is_post)
+        csoup = bs4.BeautifulSoup(text, 'html.parser', parse_only=only)
+    else:
+        csoup = bs4.BeautifulSoup(text, 'html.parser')
+    # Extract posts from current page
+    meme_posts = csoup.find_all(class_=_POST_CLASS, limit=n)
+    return [(x['alt'], x['src']) for x in meme_posts]
+
+
+def quickmeme(text, n=None, parser=None):
+    """ Return the first n memes on a quickmeme.com page
+
+    :param str text: The HTML of the page
+    :param int n: Max number of memes, all the memes on the page when None
+    :param str parser: A name in QUICKMEME_PARSERS, the default_parser
+        when None
+    :return: A list of Meme objects
+    :rtype: list
+    :raises ValueError: if the parser is not known
+    """
+    if parser is None:
+        parser = default_parser()
+    if parser == "lxml":
+        meme_posts = _posts_lxml(text, n)
+    elif parser in ("strainer", "html.parser"):
+        meme_posts = _posts_soup(text, n, parser == "strainer")
+    else:
+        raise ValueError("Not a supported parser. Parsers available: " +
+                         ", ".join(QUICKMEME_PARSERS))
+
+    # Extract captions and picture urls from posts
+    texts = [str(alt).rpartition("  ") for alt, src in meme_posts]
+    urls = [str(src) for alt, src in meme_posts]
+
+    meme_list = []
+    for i in range(len(meme_posts)):
+        time = datetime.datetime.now()
+        meme_list.append(Meme(urls[i], time, caption=texts[i][0],
+                              origin=Origins.QUICKMEME, tags=[texts[i][-1]]))
+    return meme_list
+
+
+def memegenerator(json_memes):
+    """ Return the memes in a response of the memegenerator.net API
+
+    :param dict json_memes: The decoded JSON of the response
+    :return: A list of Meme objects
+    :rtype: list
+    """
+    cmemes = json_memes["result"]
+    meme_list = []
+
+    for x in cmemes:
+
+        # Picture url
+        instance_image_url = ""
+        try:
+            instance_image_url = x["instanceImageUrl"]
+        except KeyError:
+            pass
+
+        # Caption
+        ccaption = x["text0"]
+        try:
+            extra = " --- " + x["text1"]
+            ccaption += extra
+        except TypeError:  # Returned json sometimes doesn't have text1
+            pass
+        except KeyError:  # Does not have the text1 tags
+            pass
+
+        # Raw image (meme macro) url
+        imageUrl = ""
+        try:
+            imageUrl = x["imageUrl"]
+        except KeyError:
+            pass
+
+        # Tags
+        ctags = []
+        try:
+            ctags += [x["displayName"]]
+        except KeyError:
+            pass
+
+        cscore = -1
+        try:
+            cscore = x["totalVotesScore"]
+        except KeyError:
+            pass
+
+        cmeme = Meme(instance_image_url,
+                     datetime.datetime.now(),
+                     caption=ccaption,
+                     raw_pic_url=imageUrl,
+                     origin=Origins.MEMEGENERATOR,
+                     tags=ctags,
+                     score=cscore)
+        meme_list.append(cmeme)
+
+    return meme_list
@@ -0,0 +1,165 @@
+""" Site Cache Module
+
+The memes scraped from every MemeSite are kept in an SQLite database in
+the meme_get cache directory. A small sites table holds the time each
+site was last scraped, so checking whether a cache expired reads a single
+row. The memes are stored one per row, in order of popularity, so they
+can be read partially, and a site is always saved in one transaction.
+"""
+
+from __future__ import absolute_import
+import contextlib
+import datetime
+import os
+import pickle
+import sqlite3
+import threading
+from .cachedir import cache_dir
+
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+_SCHEMA = ["""CREATE TABLE IF NOT EXISTS sites (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    updated TEXT NOT NULL)""",
+           """CREATE TABLE IF NOT EXISTS memes (
+    key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    fetched TEXT NOT NULL,
+    meme BLOB NOT NULL,
+    PRIMARY KEY (key, position))"""]
+
+
+def _dump_time(t):
+    return t.strftime(_TIME_FORMAT)
+
+
+def _load_time(s):
+    return datetime.datetime.strptime(s, _TIME_FORMAT)
+
+
+class SiteCache(object):
+    """ A persistent cache of the memes of meme sites
+
+    Every site is stored under a key of its own, see
+    :meth:`meme_get.memesites.MemeSite._cache_key`.
+
+    **Attributes:**
+        * _path (str): The path to the SQLite database
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(cache_dir("sites"), "memes.sqlite")
+        self._path = path
+
+        with self._connect() as db:
+            for table in _SCHEMA:
+                db.execute(table)
+
+    def updated(self, key):
+        """ The time a site was last saved
+
+        :param str key: The key of the site
+        :return: The update time saved with the memes, or None if the
+            site is not cached
+        :rtype: datetime object
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT updated FROM sites WHERE key = ?",
+                             (key,)).fetchone()
+        return _load_time(row[0]) if row is not None else None
+
+    def load(self, key, limit=None):
+        """ Read the memes of a site
+
+        :param str key: The key of the site
+        :param int limit: Max number of memes to read, all when None
+        :return: The update time of the site, or None if it is not cached,
+            and a list of (meme, fetch time) tuples from the most popular
+            meme on
+        :rtype: tuple
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT updated FROM sites WHERE key = ?",
+                             (key,)).fetchone()
+            if row is None:
+                return None, []
+            rows = db.execute("SELECT meme, fetched FROM memes WHERE key = ? "
+                              "ORDER BY position LIMIT ?",
+                              (key, -1 if limit is None else limit))
+            memes = [(pickle.loads(bytes(m)), _load_time(t)) for m, t in rows]
+        return _load_time(row[0]), memes
+
+    def save(self, key, url, updated, memes):
+        """ Replace the memes of a site
+
+        :param str key: The key of the site
+        :param str url: The url of the site
+        :param datetime updated: The time the site was scraped
+        :param list memes: A list of (meme, fetch time) tuples from the
+            most popular meme on
+        """
+        rows = [(key, i, m.get_pic_url(), _dump_time(t),
+                 sqlite3.Binary(pickle.dumps(m, protocol=2)))
+                for i, (m, t) in enumerate(memes)]
+        with self._connect() as db:
+            db.execute("DELETE FROM memes WHERE key = ?", (key,))
+            db.executemany("INSERT INTO memes VALUES (?, ?, ?, ?, ?)", rows)
+            db.execute("INSERT OR REPLACE INTO sites VALUES (?, ?, ?)",
+                       (key, url, _dump_time(updated)))
+
+    def remove(self, key):
+        """ Remove a site from the cache
+
+        :param str key: The key of the site
+        """
+        with self._connect() as db:
+            db.execute("DELETE FROM memes WHERE key = ?", (key,))
+            db.execute("DELETE FROM sites WHERE key = ?", (key,))
+
+    def clear(self):
+        """ Remove every site from the cache
+        """
+        with self._connect() as db:
+            db.execute("DELETE FROM memes")
+            db.execute("DELETE FROM sites")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """ Open the database for one transaction
+        """
+        db = sqlite3.connect(self._path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """ Return the site cache used by meme sites
+
+    :rtype: SiteCache
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = SiteCache()
+        return _default
+
+
+def set_default_cache(cache):
+    """ Replace the site cache used by meme sites
+
+    :param cache: A SiteCache, or None to go back to the one in the
+        cache directory
+    """
+    global _default
+    with _default_lock:
+        _default = cache
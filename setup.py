@@ -36,6 +36,9 @@ setup(name=PACKAGE_NAME,
           'pyenchant',
           'praw',
           'lxml',
+          'numpy',
           'Pillow'],
+      extras_require={
+          'async': ['aiohttp>=3.3']},
       packages=find_packages(exclude=['tests', 'tests.*']),
       include_package_data=True)
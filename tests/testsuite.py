@@ -1,9 +1,40 @@
 import unittest
 from unittest import mock
 from meme_get import memesites
+from meme_get import download
+from meme_get import imagecache
+from meme_get import cachedir
+from meme_get import ocrcache
+from meme_get import sitecache
+from meme_get import parsers
+from meme_get import asyncsites
+from meme_get.ocr import threshold
+from meme_get.ocr import components
+from meme_get.ocr import glyphs
+from meme_get.ocr import wordlist
+from meme_get.ocr import parse
+from meme_get.ocr import util
+from meme_get.ocr import tesseract
+from meme_get.ocr import ocrcomp
+from meme_get.ocr import memeocr
+from meme_get.ocr import preprocess
+from PIL import Image
 from collections import deque
+import asyncio
+import io
+import itertools
 import json
+import contextlib
 import datetime
+import numpy as np
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 
 
 class MemeTest(unittest.TestCase):
@@ -58,16 +89,411 @@ class MemeTest(unittest.TestCase):
         self.assertTrue(len(set([A, B, C, D])) == 3)
 
 
+class StuckMeme(memesites.Meme):
+    """ A meme whose OCR hangs where SIGALRM cannot stop it
+    """
+
+    def ocr_caption(self, method="Tesseract", **kwargs):
+        if self.get_pic_url() == "stuck":
+            signal.signal(signal.SIGALRM, signal.SIG_IGN)
+            time.sleep(60)
+        self._caption = "ok"
+
+
+class OcrLogTest(unittest.TestCase):
+    """ Test that Meme.ocr_caption is quiet by default
+    """
+
+    def test_quiet(self):
+        """ The OCR method and the Auto pick are logged, not printed
+        """
+        out = io.StringIO()
+        pick = ocrcomp.Candidate("FontMatching", "auto", 1.0, 0.1)
+        with contextlib.redirect_stdout(out), \
+                mock.patch.object(ocrcomp, "ocrTesseract",
+                                  return_value="tesseract"), \
+                mock.patch.object(ocrcomp, "best", return_value=pick), \
+                self.assertLogs("meme_get.memesites", "DEBUG") as logs:
+            A = memesites.Meme('1', '2')
+            A.ocr_caption("Tesseract", image=b"picture", thres=False,
+                          cfg="urban")
+            B = memesites.Meme('1', '2')
+            B.ocr_caption("Auto", image=b"picture", thres=False,
+                          cfg="urban")
+        self.assertEqual(out.getvalue(), "")
+        self.assertEqual((A.get_caption(), B.get_caption()),
+                         ("tesseract", "auto"))
+        self.assertIn("Auto picked FontMatching", logs.output[-1])
+
+
+class OcrCaptionsTest(unittest.TestCase):
+    """ Test the per-meme OCR worker used by ocr_captions
+    """
+
+    def test_worker(self):
+        """ The worker returns the caption of the meme
+        """
+        def fake_ocr(self, method, **kwargs):
+            self._caption = method + kwargs["cfg"]
+
+        with mock.patch.object(memesites.Meme, 'ocr_caption', fake_ocr):
+            A = memesites.Meme('1', '2')
+            result = memesites._ocr_worker(A, "Tesseract", None,
+                                           {"cfg": "urban"})
+        self.assertEqual(result, ("Tesseracturban", None))
+
+    def test_worker_error(self):
+        """ Errors are returned for the meme instead of raised
+        """
+        with mock.patch.object(memesites.Meme, 'ocr_caption',
+                               side_effect=ValueError("bad")):
+            caption, err = memesites._ocr_worker(
+                memesites.Meme('1', '2'), "Auto", None, {})
+        self.assertTrue(caption is None)
+        self.assertTrue(isinstance(err, ValueError))
+
+    def test_worker_timeout(self):
+        """ A meme taking too long is stopped
+        """
+        with mock.patch.object(memesites.Meme, 'ocr_caption',
+                               side_effect=lambda *a, **k: time.sleep(5)):
+            start = time.time()
+            caption, err = memesites._ocr_worker(
+                memesites.Meme('1', '2'), "Tesseract", 0.1, {})
+        self.assertTrue(isinstance(err, memesites.OcrTimeout))
+        self.assertTrue(time.time() - start < 1)
+
+    def test_worker_restores_handler(self):
+        """ The worker puts back the SIGALRM handler it replaced
+        """
+        handler = signal.getsignal(signal.SIGALRM)
+        with mock.patch.object(memesites.Meme, 'ocr_caption'):
+            memesites._ocr_worker(memesites.Meme('1', '2'), "Tesseract",
+                                  5, {})
+        self.assertEqual(signal.getsignal(signal.SIGALRM), handler)
+
+    def test_hung_worker(self):
+        """ A worker that ignores the alarm does not stall the batch
+        """
+        memes = [StuckMeme("stuck", "2"), StuckMeme("1", "2")]
+        start = time.time()
+        with mock.patch.object(memesites, "OCR_GRACE", 1):
+            results = memesites.ocr_captions(memes, workers=2, timeout=0.5)
+        self.assertTrue(time.time() - start < 20)
+        self.assertTrue(isinstance(results[0][1], memesites.OcrTimeout))
+        self.assertEqual(results[1], (memes[1], None))
+        self.assertEqual(memes[1].get_caption(), "ok")
+
+
+class DownloadTest(unittest.TestCase):
+    """ Test the picture downloads
+    """
+
+    def test_image_url(self):
+        """ Picture pages get a picture extension
+        """
+        self.assertEqual(download.image_url("http://a/b.png"),
+                         "http://a/b.png")
+        self.assertEqual(download.image_url("http://a/b"), "http://a/b.jpg")
+
+    def test_session(self):
+        """ One session is shared by all downloads of a process
+        """
+        self.assertTrue(download.get_session() is download.get_session())
+
+    @mock.patch('meme_get.download.get_session')
+    def test_fetch(self, mock_session):
+        """ Downloads use the shared session and a timeout
+        """
+        get = mock_session.return_value.get
+        get.return_value.content = b"data"
+        self.assertEqual(download.fetch("http://a/b.jpg", timeout=3),
+                         b"data")
+        get.assert_called_once_with("http://a/b.jpg", timeout=3)
+
+    @mock.patch('meme_get.download.fetch')
+    def test_prefetch(self, mock_fetch):
+        """ Pictures are downloaded in the order of the memes
+        """
+        def fake_fetch(url, timeout):
+            if url == "http://a/bad.jpg":
+                raise IOError("bad")
+            return url.encode('utf-8')
+        mock_fetch.side_effect = fake_fetch
+
+        memes = [memesites.Meme("http://a/{}.jpg".format(x), '1')
+                 for x in ["1", "bad", "2"]]
+        result = download.prefetch(memes, workers=2)
+        self.assertEqual([r[0] for r in result], memes)
+        self.assertEqual(result[0][1:], (b"http://a/1.jpg", None))
+        self.assertTrue(result[1][1] is None)
+        self.assertTrue(isinstance(result[1][2], IOError))
+        self.assertEqual(result[2][1:], (b"http://a/2.jpg", None))
+
+        directory = tempfile.mkdtemp()
+        try:
+            result = download.prefetch(memes[:1], directory=directory)
+            with open(result[0][1], 'rb') as f:
+                self.assertEqual(f.read(), b"http://a/1.jpg")
+        finally:
+            shutil.rmtree(directory)
+
+    @mock.patch('meme_get.download.time.sleep')
+    @mock.patch('meme_get.download.get_session')
+    def test_get_page(self, mock_session, mock_sleep):
+        """ Pages are retried with backoff on transient failures
+        """
+        get = mock_session.return_value.get
+        limiter = download.RateLimiter(None)
+        get.side_effect = [download.requests.ConnectionError("down"),
+                           MockResponse(b"", 503), MockResponse(b"page")]
+        r = download.get_page("http://a/1", params={"a": 1}, tries=3,
+                              backoff=1, limiter=limiter)
+        self.assertEqual(r.content, b"page")
+        get.assert_called_with("http://a/1", params={"a": 1},
+                               timeout=download.TIMEOUT)
+        self.assertEqual([c[0][0] for c in mock_sleep.call_args_list],
+                         [1, 2])
+
+        # Other errors are not retried
+        get.side_effect = [MockResponse(b"", 404)]
+        self.assertEqual(download.get_page("http://a/1", tries=3,
+                                           limiter=limiter).status_code, 404)
+
+        # The last failure is raised
+        get.side_effect = [MockResponse(b"", 503)] * 2
+        with self.assertRaises(IOError):
+            download.get_page("http://a/1", tries=2, limiter=limiter)
+
+    def test_rate_limiter(self):
+        """ Requests to the same host are spaced out
+        """
+        limiter = download.RateLimiter(20)
+        start = time.time()
+        for i in range(3):
+            limiter.wait("http://a/{:d}".format(i))
+        self.assertGreaterEqual(time.time() - start, 0.09)
+
+        start = time.time()
+        limiter.wait("http://b/1")
+        self.assertLess(time.time() - start, 0.05)
+
+    @mock.patch('meme_get.download.fetch')
+    def test_caption_before_download(self, mock_fetch):
+        """ Memes that have a caption are not downloaded
+        """
+        A = memesites.Meme('1', '2', caption="caption")
+        A.ocr_caption("Tesseract", thres=True, cfg="urban")
+        self.assertFalse(mock_fetch.called)
+
+
+class MockResponse(object):
+    """ Mock requests response holding some content
+    """
+
+    def __init__(self, content, status_code=200, headers=None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise IOError(self.status_code)
+
+
+class ImageCacheTest(unittest.TestCase):
+    """ Test the on-disk image cache
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        patcher = mock.patch('meme_get.download.get_session')
+        self.get = patcher.start().return_value.get
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cache_dir(self):
+        """ The cache directory can be moved with an environment variable
+        """
+        with mock.patch.dict(os.environ,
+                             {cachedir.ENV_VAR: self.directory}):
+            path = cachedir.cache_dir("images")
+        self.assertEqual(path, os.path.join(self.directory, "images"))
+        self.assertTrue(os.path.isdir(path))
+
+    def test_get(self):
+        """ Fresh pictures are read from disk without the network
+        """
+        self.get.return_value = MockResponse(b"picture")
+        A = imagecache.ImageCache(self.directory)
+
+        self.assertEqual(A.get("http://a/1.jpg")[:], b"picture")
+        self.assertEqual(A.get("http://a/1.jpg")[:], b"picture")
+        self.assertEqual(self.get.call_count, 1)
+
+        # Same content at another url is stored once
+        self.assertEqual(A.get("http://a/2.jpg")[:], b"picture")
+        self.assertEqual(A.size(), len(b"picture"))
+
+    def test_revalidate(self):
+        """ Old pictures are revalidated with their ETag
+        """
+        A = imagecache.ImageCache(self.directory, max_age=0)
+        self.get.return_value = MockResponse(b"picture",
+                                             headers={"ETag": "x"})
+        A.get("http://a/1.jpg")
+
+        self.get.return_value = MockResponse(b"", status_code=304)
+        self.assertEqual(A.get("http://a/1.jpg")[:], b"picture")
+        self.assertEqual(self.get.call_args[1]["headers"],
+                         {"If-None-Match": "x"})
+
+        # Offline or on server errors, the cached picture is still used
+        self.get.side_effect = IOError("offline")
+        self.assertEqual(A.get("http://a/1.jpg")[:], b"picture")
+        self.get.side_effect = None
+        self.get.return_value = MockResponse(b"", status_code=503)
+        self.assertEqual(A.get("http://a/1.jpg")[:], b"picture")
+
+        self.get.side_effect = None
+        self.get.return_value = MockResponse(b"changed")
+        self.assertEqual(A.get("http://a/1.jpg")[:], b"changed")
+        self.assertEqual(A.size(), len(b"changed"))
+
+    def test_removed(self):
+        """ A picture removed from disk is downloaded again
+        """
+        A = imagecache.ImageCache(self.directory)
+        self.get.return_value = MockResponse(b"picture")
+        A.get("http://a/1.jpg")
+
+        # As if another thread evicted it after the lookup
+        A._remove(A._lookup("http://a/1.jpg")[0])
+        self.assertEqual(A.get("http://a/1.jpg")[:], b"picture")
+        self.assertEqual(self.get.call_count, 2)
+
+    def test_default_off(self):
+        """ Pictures are only cached on disk when asked to
+        """
+        with mock.patch.object(imagecache, "_default", None):
+            self.assertTrue(imagecache.default_cache() is None)
+            A = imagecache.ImageCache(self.directory)
+            imagecache.set_default_cache(A)
+            self.assertTrue(imagecache.default_cache() is A)
+
+    def test_evict(self):
+        """ The least recently used pictures are evicted over the cap
+        """
+        A = imagecache.ImageCache(self.directory, max_bytes=10)
+        for x in [b"aaaa", b"bbbb", b"cccc"]:
+            self.get.return_value = MockResponse(x)
+            A.get("http://a/" + x.decode('utf-8'))
+
+        self.assertEqual(A.size(), 8)
+        self.get.return_value = MockResponse(b"new")
+        self.assertEqual(A.get("http://a/aaaa")[:], b"new")
+        self.assertEqual(A.get("http://a/cccc")[:], b"cccc")
+        A.clear()
+        self.assertEqual(A.size(), 0)
+
+
+class OcrCacheTest(unittest.TestCase):
+    """ Test the persistent OCR result cache
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "results.sqlite")
+        self.default = ocrcache._default
+
+    def tearDown(self):
+        ocrcache._default = self.default
+        shutil.rmtree(self.directory)
+
+    def test_resources(self):
+        """ Every file hashed into the OCR version is in the package
+        """
+        for path in ocrcache.RESOURCES:
+            self.assertTrue(os.path.isfile(path), path)
+
+    def test_image_digest(self):
+        """ Pictures hash the same as bytes, files and file objects
+        """
+        path = os.path.join(self.directory, "picture")
+        with open(path, 'wb') as f:
+            f.write(b"picture")
+        digest = ocrcache.image_digest(b"picture")
+        self.assertEqual(ocrcache.image_digest(path), digest)
+        self.assertEqual(ocrcache.image_digest(io.BytesIO(b"picture")),
+                         digest)
+
+    def test_get_put(self):
+        """ Results are keyed by picture and settings
+        """
+        A = ocrcache.OcrCache(self.path)
+        A.put("abc", "Tesseract", True, "urban", "caption")
+        self.assertEqual(A.get("abc", "Tesseract", True, "urban"), "caption")
+        self.assertTrue(A.get("abc", "Tesseract", False, "urban") is None)
+        self.assertTrue(A.get("abc", "FontMatching") is None)
+
+        # Results survive in a new cache object
+        B = ocrcache.OcrCache(self.path)
+        self.assertEqual(B.get("abc", "Tesseract", True, "urban"), "caption")
+
+    def test_version(self):
+        """ Results of another OCR version are dropped
+        """
+        ocrcache.OcrCache(self.path).put("abc", "FontMatching", None, None,
+                                         "caption")
+        with mock.patch('meme_get.ocrcache.version', return_value="new"):
+            A = ocrcache.OcrCache(self.path)
+            self.assertTrue(A.get("abc", "FontMatching") is None)
+        self.assertTrue(A.get("abc", "FontMatching") is None)
+
+    def test_ocr_caption(self):
+        """ Meme.ocr_caption runs OCR once per picture and settings
+        """
+        ocrcache.set_default_cache(ocrcache.OcrCache(self.path))
+
+        def fake_ocr(self, method, path, kwargs):
+            self._caption = "caption"
+
+        with mock.patch.object(memesites.Meme, '_run_ocr',
+                               autospec=True, side_effect=fake_ocr) as ocr:
+            A = memesites.Meme('1', '2')
+            A.ocr_caption("FontMatching", image=b"picture")
+            B = memesites.Meme('3', '4')
+            B.ocr_caption("FontMatching", image=b"picture")
+            self.assertEqual(B.get_caption(), "caption")
+            self.assertEqual(ocr.call_count, 1)
+
+    def test_default_off(self):
+        """ Results are only cached on disk when asked to
+        """
+        ocrcache._default = None
+        self.assertTrue(ocrcache.default_cache() is None)
+
+        def fake_ocr(self, method, path, kwargs):
+            self._caption = "caption"
+
+        with mock.patch.object(memesites.Meme, '_run_ocr',
+                               autospec=True, side_effect=fake_ocr), \
+                mock.patch.object(ocrcache, "OcrCache") as cache:
+            memesites.Meme('1', '2').ocr_caption("FontMatching",
+                                                 image=b"picture")
+        self.assertEqual(cache.call_count, 0)
+
+
 class MemeSiteTest(unittest.TestCase):
     """ Test the MemeSite class
     """
 
-    @mock.patch('meme_get.memesites.requests.get', side_effect=lambda x: x)
-    def test_clean_meme_pool(self, mock_get):
-        """ Test the clean meme pool function with mock requests.get
+    def test_clean_meme_pool(self):
+        """ Test the clean meme pool function
 
-        Mocked so that the requests package does not actually make
-        http requests
+        Making a MemeSite does not make http requests
         """
         # Test with fake meme pool and no internet connection
         A = memesites.MemeSite("http://www.google.com")
@@ -75,9 +501,8 @@ class MemeSiteTest(unittest.TestCase):
         A.clean_meme_pool()
         self.assertTrue(A._meme_pool == set())
 
-    @mock.patch('meme_get.memesites.requests.get', side_effect=lambda x: x)
-    def test_clean_meme_deque(self, mock_get):
-        """ Test the clean meme deque function with mock requests.get
+    def test_clean_meme_deque(self):
+        """ Test the clean meme deque function
         """
         # Test with fake meme pool and no internet connection
         A = memesites.MemeSite("http://www.google.com")
@@ -85,8 +510,7 @@ class MemeSiteTest(unittest.TestCase):
         A.clean_meme_deque()
         self.assertTrue(A._meme_deque == deque())
 
-    @mock.patch('meme_get.memesites.requests.get', side_effect=lambda x: x)
-    def test_get_url(self, mock_get):
+    def test_get_url(self):
         """ Test the get url function
 
         The url returned by the get_url function should be the same
@@ -95,8 +519,7 @@ class MemeSiteTest(unittest.TestCase):
         A = memesites.MemeSite("http://www.google.com")
         self.assertTrue("http://www.google.com" == A.get_url())
 
-    @mock.patch('meme_get.memesites.requests.get', side_effect=lambda x: x)
-    def test_get_meme_pool(self, mock_get):
+    def test_get_meme_pool(self):
         """ Test the get_meme_pool function
         """
         # Test with fake meme pool and no internet connection
@@ -105,8 +528,7 @@ class MemeSiteTest(unittest.TestCase):
 
         self.assertTrue(A.get_meme_pool() == set('abc'))
 
-    @mock.patch('meme_get.memesites.requests.get', side_effect=lambda x: x)
-    def test_get_meme_num(self, mock_get):
+    def test_get_meme_num(self):
         """ Test the get_meme_num function
         """
         A = memesites.MemeSite("1")
@@ -114,6 +536,546 @@ class MemeSiteTest(unittest.TestCase):
         self.assertTrue(A.get_meme_num() == 3)
 
 
+class FakeSite(memesites.MemeSite):
+    """ A MemeSite whose pages are lists of picture urls
+    """
+
+    def __init__(self, pages, cache, cache_size):
+        super(FakeSite, self).__init__("fake", cache_size, cache=cache)
+        self._posts_per_page = 3
+        self.pages = pages
+        self.requested = []
+
+    def _get_memes_helper(self, page_num):
+        self.requested.append(page_num)
+        urls = self.pages[page_num - 1] if page_num <= len(self.pages) else []
+        return [memesites.Meme(u, datetime.datetime.now()) for u in urls]
+
+
+class CacheRefreshTest(unittest.TestCase):
+    """ Test the incremental refresh of MemeSite caches
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = sitecache.SiteCache(
+            os.path.join(self.directory, "memes.sqlite"))
+        urls = ["m{:d}".format(i) for i in range(9)]
+        self.site = FakeSite([urls[0:3], urls[3:6], urls[6:9]],
+                             self.cache, 9)
+        self.site._build_cache()
+        self.site.requested = []
+        self.old = dict((m.get_pic_url(), m) for m in self.site._meme_deque)
+
+    def urls(self):
+        return [m.get_pic_url() for m in reversed(self.site._meme_deque)]
+
+    def test_refresh(self):
+        """ Only the pages down to the cached memes are requested
+        """
+        self.site.pages = [["n0", "m0", "m1"], ["m2", "m3", "m4"],
+                           ["m5", "m6", "m7"], ["m8"]]
+        self.site._refresh_cache()
+
+        self.assertEqual(self.site.requested, [1, 2])
+        self.assertEqual(self.urls(),
+                         ["n0"] + ["m{:d}".format(i) for i in range(8)])
+        # Cached memes are kept as they were
+        self.assertEqual(self.site._meme_deque[-2], self.old["m0"])
+        self.assertEqual(len(self.site.get_meme_pool()), 9)
+
+        # The refreshed cache is saved
+        site = FakeSite([], self.cache, 9)
+        site._update_with_cache()
+        self.assertEqual(site.get_meme_num(), 9)
+        self.assertIn("n0", site._fetch_times)
+
+    def test_expire_entries(self):
+        """ Memes not seen on the site for too long are dropped
+        """
+        old = datetime.datetime.now() - datetime.timedelta(days=30)
+        self.site._fetch_times["m1"] = old
+        self.site._fetch_times["m5"] = old
+        self.site._save_cache()
+
+        self.site.pages = [["n0", "m0", "m1"], ["m2", "m3", "m4"],
+                           ["m5", "m6", "m7"], ["m8"]]
+        self.site._refresh_cache()
+
+        # m1 was seen again, m5 was not
+        self.assertEqual(self.urls(), ["n0", "m0", "m1", "m2", "m3", "m4",
+                                       "m6", "m7", "m8"])
+        self.assertGreater(self.site._fetch_times["m1"], old)
+
+    def test_populate(self):
+        """ Pages are requested concurrently and kept in page order
+        """
+        self.site.pages = [["p{:d}{:d}".format(i, j) for j in range(3)]
+                           for i in range(4)]
+        self.site._cache_size = 10
+        running = [0, 0]
+        lock = threading.Lock()
+        helper = self.site._get_memes_helper
+
+        def slow_helper(page_num):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            # The first page is the slowest
+            time.sleep(0.1 if page_num == 1 else 0.02)
+            with lock:
+                running[0] -= 1
+            return helper(page_num)
+
+        self.site._get_memes_helper = slow_helper
+        self.site._build_cache()
+        self.assertEqual(self.urls(),
+                         ["p{:d}{:d}".format(i, j) for i in range(4)
+                          for j in range(3)][:10])
+        self.assertEqual(sorted(self.site.requested), [1, 2, 3, 4])
+        self.assertGreater(running[1], 1)
+
+    def test_populate_errors(self):
+        """ A failed page is skipped and the other pages are kept
+        """
+        self.site.pages = [["p{:d}{:d}".format(i, j) for j in range(3)]
+                           for i in range(4)]
+        helper = self.site._get_memes_helper
+
+        def flaky_helper(page_num):
+            if page_num == 2:
+                raise IOError("page 2 is down")
+            return helper(page_num)
+
+        self.site._get_memes_helper = flaky_helper
+        with mock.patch.object(sys, "stderr", io.StringIO()) as stderr:
+            self.site._build_cache()
+        self.assertEqual(self.urls(), ["p00", "p01", "p02",
+                                       "p20", "p21", "p22"])
+        self.assertIn("page 2", stderr.getvalue())
+
+        # Nothing is cached when every page fails
+        self.site._get_memes_helper = mock.Mock(side_effect=IOError("down"))
+        with mock.patch.object(sys, "stderr", io.StringIO()):
+            self.assertRaises(IOError, self.site._build_cache)
+
+    def test_iter_memes(self):
+        """ Cached memes come first, then the pages after them
+        """
+        self.site.pages = [["m{:d}".format(3 * i + j) for j in range(3)]
+                           for i in range(5)]
+
+        # Memes within the cache need no request
+        memes = list(itertools.islice(self.site.iter_memes(), 4))
+        self.assertEqual([m.get_pic_url() for m in memes],
+                         ["m0", "m1", "m2", "m3"])
+        self.assertEqual(self.site.requested, [])
+        self.assertEqual(self.site.get_memes(4), memes)
+        self.assertEqual(self.site.requested, [])
+
+        memes = self.site.get_memes(13)
+        self.assertEqual([m.get_pic_url() for m in memes],
+                         ["m{:d}".format(i) for i in range(13)])
+        self.assertEqual(memes[0], self.old["m0"])
+        # No page is requested past the memes asked for
+        time.sleep(0.05)
+        self.assertEqual(self.site.requested, [4, 5])
+
+        # The site runs out after page 5
+        self.site.requested = []
+        self.assertEqual(len(list(self.site.iter_memes())), 15)
+        self.assertEqual(self.site.requested, [4, 5, 6])
+
+    def test_prefetch(self):
+        """ The next page is requested while a page is consumed
+        """
+        self.site.pages = [["m{:d}".format(3 * i + j) for j in range(3)]
+                           for i in range(5)]
+        memes = self.site.iter_memes()
+        for i in range(10):
+            next(memes)
+        time.sleep(0.05)
+        self.assertEqual(self.site.requested, [4, 5])
+        memes.close()
+
+        # Pages shifted by new memes are not yielded twice
+        self.site.pages[3] = ["m8", "m9", "m10"]
+        urls = [m.get_pic_url() for m in self.site.get_memes(12)]
+        self.assertEqual(urls, ["m{:d}".format(i) for i in range(11)] +
+                         ["m12"])
+
+    def test_partial_page(self):
+        """ A cache ending within a page resumes after its last meme
+        """
+        self.site._posts_per_page = 4
+        self.site.pages = [["m{:d}".format(4 * i + j) for j in range(4)]
+                           for i in range(4)]
+        more = self.site._more_memes(9, 3)
+        urls = [m.get_pic_url() for m in itertools.islice(more, 3)]
+        more.close()
+        self.assertEqual(urls, ["m9", "m10", "m11"])
+
+        self.site.requested = []
+        urls = [m.get_pic_url() for m in self.site.get_memes(12)]
+        self.assertEqual(urls, ["m{:d}".format(i) for i in range(12)])
+        time.sleep(0.05)
+        self.assertEqual(self.site.requested, [3])
+
+    def test_warm(self):
+        """ The cache is built once, in the background if asked for
+        """
+        site = FakeSite(self.site.pages, sitecache.SiteCache(
+            os.path.join(self.directory, "other.sqlite")), 9)
+        with mock.patch.object(site, "_build_cache",
+                               wraps=site._build_cache) as build:
+            future = site.warm(background=True)
+            self.assertIsNone(future.result())
+            memes = site.get_memes(3)
+            site.warm()
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual([m.get_pic_url() for m in memes],
+                         ["m0", "m1", "m2"])
+
+    def test_limited_read(self):
+        """ Only the cached memes asked for are read
+        """
+        with mock.patch.object(self.cache, "load",
+                               wraps=self.cache.load) as load:
+            memes = self.site.get_memes(4)
+        self.assertEqual(len(memes), 4)
+        load.assert_called_once_with(self.site._cache_key(), 4)
+
+    def test_stream_build(self):
+        """ A missing cache is grown with the memes as they are read
+        """
+        cache = sitecache.SiteCache(
+            os.path.join(self.directory, "other.sqlite"))
+        site = FakeSite([["m{:d}".format(3 * i + j) for j in range(3)]
+                         for i in range(5)], cache, 9)
+        key = site._cache_key()
+
+        memes = site.iter_memes()
+        self.assertEqual(next(memes).get_pic_url(), "m0")
+        self.assertIsNone(cache.updated(key))
+        urls = [m.get_pic_url() for m in itertools.islice(memes, 4)]
+        memes.close()
+        self.assertEqual(urls, ["m1", "m2", "m3", "m4"])
+        self.assertEqual(len(cache.load(key)[1]), 5)
+
+        # The memes read past a small cache are added to it
+        urls = [m.get_pic_url() for m in site.get_memes(12)]
+        self.assertEqual(urls, ["m{:d}".format(i) for i in range(12)])
+        self.assertEqual([m.get_pic_url() for m, t in cache.load(key)[1]],
+                         ["m{:d}".format(i) for i in range(9)])
+
+        site.requested = []
+        self.assertEqual(len(site.get_memes(9)), 9)
+        self.assertEqual(site.requested, [])
+
+    def test_stream_refresh(self):
+        """ An expired cache is refreshed as its memes are yielded
+        """
+        old = datetime.datetime.now() - datetime.timedelta(days=30)
+        self.site._last_update = old
+        self.site._save_cache()
+        key = self.site._cache_key()
+
+        self.site.pages = [["n0", "m0", "m1"], ["m2", "m3", "m4"],
+                           ["m5", "m6", "m7"], ["m8"]]
+        memes = self.site.iter_memes()
+        self.assertEqual(next(memes).get_pic_url(), "n0")
+        self.assertEqual(self.site.requested, [1])
+        self.assertEqual(self.cache.updated(key), old)
+
+        # The refresh is finished when the generator is closed
+        memes.close()
+        self.assertEqual(self.site.requested, [1, 2])
+        self.assertGreater(self.cache.updated(key), old)
+        self.assertEqual([m.get_pic_url() for m, t in self.cache.load(key)[1]],
+                         ["n0"] + ["m{:d}".format(i) for i in range(8)])
+
+        # Past the refresh, the memes after the cache are read
+        self.site.pages.append(["m9"])
+        self.site._last_update = old
+        self.site._save_cache()
+        urls = [m.get_pic_url() for m in self.site.get_memes(11)]
+        self.assertEqual(urls, ["n0"] + ["m{:d}".format(i) for i in range(10)])
+
+    def test_churn(self):
+        """ Every page is read when all the memes are new
+        """
+        self.site.pages = [["n0", "n1", "n2"], ["n3", "n4", "n5"],
+                           ["n6", "n7", "n8"], ["n9"]]
+        self.site._refresh_cache()
+
+        self.assertEqual(self.site.requested, [1, 2, 3])
+        self.assertEqual(self.urls(), ["n{:d}".format(i) for i in range(9)])
+
+
+class LazySiteTest(unittest.TestCase):
+    """ Test that making a site does no I/O
+    """
+
+    @mock.patch('meme_get.download.get_session')
+    def test_no_io(self, mock_session):
+        """ Sites neither request pages nor touch the cache when made
+        """
+        cache = mock.Mock()
+        with mock.patch("configparser.ConfigParser.read") as read:
+            memesites.QuickMeme(cache=cache)
+            memesites.MemeGenerator(cache=cache)
+            memesites.RedditMemes(cache=cache)
+        self.assertFalse(mock_session.called)
+        self.assertFalse(read.called)
+        self.assertEqual(cache.mock_calls, [])
+
+        # The cache is only read when memes are asked for
+        now = datetime.datetime.now()
+        memes = [memesites.Meme(x, now) for x in "ab"]
+        cache.updated.return_value = now
+        cache.load.return_value = (now, [(m, now) for m in memes])
+        site = memesites.QuickMeme(cache=cache)
+        self.assertEqual(site.get_memes(2), memes)
+        self.assertFalse(mock_session.called)
+
+
+class SiteCacheTest(unittest.TestCase):
+    """ Test the SQLite store of meme sites
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = sitecache.SiteCache(
+            os.path.join(self.directory, "memes.sqlite"))
+        self.time = datetime.datetime(2018, 1, 2, 3, 4, 5)
+        self.memes = [(memesites.Meme("m{:d}".format(i), self.time,
+                                      caption=str(i)),
+                       self.time + datetime.timedelta(seconds=i))
+                      for i in range(5)]
+
+    def test_cache_dir(self):
+        """ The database is kept in the cache directory
+        """
+        with mock.patch.dict(os.environ,
+                             {cachedir.ENV_VAR: self.directory}):
+            cache = sitecache.SiteCache()
+        self.assertEqual(os.path.dirname(cache._path),
+                         os.path.join(self.directory, "sites"))
+
+    def test_save_load(self):
+        """ Memes are read back in order, with their fetch times
+        """
+        self.assertIsNone(self.cache.updated("a"))
+        self.assertEqual(self.cache.load("a"), (None, []))
+
+        self.cache.save("a", "url", self.time, self.memes)
+        self.assertEqual(self.cache.updated("a"), self.time)
+        updated, memes = self.cache.load("a")
+        self.assertEqual(updated, self.time)
+        self.assertEqual(memes, self.memes)
+        self.assertEqual(memes[1][0].get_caption(), "1")
+
+        # Partial reads start from the most popular meme
+        self.assertEqual(self.cache.load("a", 2)[1], self.memes[:2])
+
+    def test_updated(self):
+        """ The update time is read without reading the memes
+        """
+        self.cache.save("a", "url", self.time, self.memes)
+        with mock.patch.object(sitecache.pickle, "loads") as loads:
+            self.assertEqual(self.cache.updated("a"), self.time)
+        loads.assert_not_called()
+
+    def test_replace(self):
+        """ Saving a site replaces its memes and leaves other sites alone
+        """
+        self.cache.save("a", "url", self.time, self.memes)
+        self.cache.save("b", "url", self.time, self.memes)
+        self.cache.save("a", "url", self.time, self.memes[3:])
+        self.assertEqual(self.cache.load("a")[1], self.memes[3:])
+        self.assertEqual(self.cache.load("b")[1], self.memes)
+
+        # A save failing half way keeps the memes saved before
+        with self.assertRaises(sitecache.sqlite3.IntegrityError):
+            self.cache.save("a", None, self.time, self.memes)
+        self.assertEqual(self.cache.load("a")[1], self.memes[3:])
+
+        self.cache.remove("a")
+        self.assertIsNone(self.cache.updated("a"))
+        self.cache.clear()
+        self.assertIsNone(self.cache.updated("b"))
+
+
+def quickmeme_page(names):
+    """ A quickmeme.com page holding a post for every name
+    """
+    posts = ['<div><img class="post-image" src="http://i/{0}.jpg" '
+             'alt="caption {0}  tag {0}"></div>'.format(x) for x in names]
+    return "<html><body>{}</body></html>".format("".join(posts))
+
+
+class ParsersTest(unittest.TestCase):
+    """ Test the parsing of site pages
+    """
+
+    def test_quickmeme(self):
+        """ Posts are read in page order
+        """
+        memes = parsers.quickmeme(quickmeme_page(["a", "b", "c"]))
+        self.assertEqual([m.get_pic_url() for m in memes],
+                         ["http://i/a.jpg", "http://i/b.jpg",
+                          "http://i/c.jpg"])
+        self.assertEqual(memes[0].get_caption(), "caption a")
+        self.assertEqual(memes[0].get_tags(), ["tag a"])
+        self.assertEqual(len(parsers.quickmeme(
+            quickmeme_page(["a", "b", "c"]), 2)), 2)
+
+    def test_backends(self):
+        """ Every HTML backend finds the same memes on a saved page
+        """
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "quickmeme_page.html")
+        with io.open(path, encoding="utf-8") as f:
+            page = f.read()
+
+        results = []
+        for parser in parsers.QUICKMEME_PARSERS:
+            memes = parsers.quickmeme(page, parser=parser)
+            results.append([(m.get_pic_url(), m.get_caption(), m.get_tags())
+                            for m in memes])
+            self.assertEqual(len(parsers.quickmeme(page, 3, parser)), 3)
+            self.assertEqual(parsers.quickmeme("", parser=parser), [])
+        self.assertEqual(len(results[0]), 10)
+        self.assertEqual(results[0][0][1],
+                         "went to bed early & woke up rested")
+        for result in results[1:]:
+            self.assertEqual(result, results[0])
+
+        with self.assertRaises(ValueError):
+            parsers.quickmeme(page, parser="regex")
+
+    def test_default_parser(self):
+        """ lxml is used when it is installed, a SoupStrainer otherwise
+        """
+        with mock.patch.object(parsers, "_default", None):
+            self.assertEqual(parsers.default_parser(), "lxml")
+        with mock.patch.object(parsers, "_default", None), \
+                mock.patch.dict(sys.modules, {"lxml.html": None}):
+            self.assertEqual(parsers.default_parser(), "strainer")
+
+    def test_memegenerator(self):
+        """ API results become memes
+        """
+        memes = parsers.memegenerator({"result": [
+            {"instanceImageUrl": "http://i/a.jpg", "text0": "top",
+             "text1": "bottom", "imageUrl": "http://i/raw.jpg",
+             "displayName": "name", "totalVotesScore": 3},
+            {"text0": "only", "text1": None}]})
+        self.assertEqual(memes[0].get_pic_url(), "http://i/a.jpg")
+        self.assertEqual(memes[0].get_caption(), "top --- bottom")
+        self.assertEqual(memes[0].get_raw_pic_url(), "http://i/raw.jpg")
+        self.assertEqual(memes[0].get_tags(), ["name"])
+        self.assertEqual(memes[1].get_caption(), "only")
+
+
+class AsyncSitesTest(unittest.TestCase):
+    """ Test the asyncio sites with fake pages
+    """
+
+    def test_get_memes(self):
+        """ Pages are requested concurrently and kept in page order
+        """
+        site = asyncsites.AsyncQuickMeme(workers=2)
+        self.assertIsNone(site._session)
+        running = [0, 0]
+        requested = []
+
+        async def fake_get_page(url, params=None):
+            requested.append(url)
+            running[0] += 1
+            running[1] = max(running)
+            page_num = int(url.rstrip("/").rpartition("/")[2])
+            # The first page is the slowest
+            await asyncio.sleep(0.05 if page_num == 1 else 0.01)
+            running[0] -= 1
+            return quickmeme_page(["{:d}-{:d}".format(page_num, i)
+                                   for i in range(10)])
+
+        with mock.patch.object(site, "_get_page", fake_get_page):
+            memes = asyncio.run(site.get_memes(25))
+        self.assertEqual(len(requested), 3)
+        self.assertEqual(running[1], 2)
+        self.assertEqual([m.get_pic_url() for m in memes],
+                         ["http://i/{:d}-{:d}.jpg".format(p, i)
+                          for p in range(1, 4) for i in range(10)][:25])
+
+    def test_failed_page(self):
+        """ The other pages are cancelled when one page fails
+        """
+        site = asyncsites.AsyncQuickMeme(workers=2)
+        finished = []
+
+        async def fake_get_page(url, params=None):
+            if url.endswith("/1/"):
+                raise IOError("page 1 is down")
+            await asyncio.sleep(1)
+            finished.append(url)
+
+        async def get_memes():
+            try:
+                await site.get_memes(30)
+            finally:
+                # Nothing is left running once get_memes raised
+                others = [t for t in asyncio.all_tasks()
+                          if t is not asyncio.current_task()]
+                self.assertEqual(others, [])
+
+        with mock.patch.object(site, "_get_page", fake_get_page):
+            self.assertRaises(IOError, asyncio.run, get_memes())
+        self.assertEqual(finished, [])
+
+    def test_memegenerator(self):
+        """ API pages are decoded and parsed like the blocking site
+        """
+        site = asyncsites.AsyncMemeGenerator(popular_type="Weekly")
+        pages = []
+
+        async def fake_get_page(url, params=None):
+            pages.append(params)
+            return json.dumps({"result": [{"instanceImageUrl": "a",
+                                           "text0": "top"}]})
+
+        with mock.patch.object(site, "_get_page", fake_get_page):
+            captions = asyncio.run(site.get_captions(1))
+        self.assertEqual(captions, ["top"])
+        self.assertEqual(pages[0]["days"], 7)
+        with self.assertRaises(ValueError):
+            asyncsites.AsyncMemeGenerator(popular_type="Yearly")
+
+    def test_rate_limiter(self):
+        """ Requests to the same host are spaced out
+        """
+        shared = download.RateLimiter(20)
+        limiter = asyncsites.AsyncRateLimiter(shared)
+
+        async def wait():
+            await asyncio.gather(*[limiter.wait("http://a/{:d}".format(i))
+                                   for i in range(3)])
+
+        start = time.time()
+        asyncio.run(wait())
+        self.assertGreaterEqual(time.time() - start, 0.09)
+
+        # The blocking downloads follow the same schedule
+        start = time.time()
+        shared.wait("http://a/4")
+        self.assertGreaterEqual(time.time() - start, 0.04)
+        self.assertTrue(asyncsites.AsyncRateLimiter()._limiter is
+                        download._limiter)
+
+
 class QuickMemeTest(unittest.TestCase):
     """ Unit test the quickmeme.com
     """
@@ -200,12 +1162,12 @@ class MemeGeneratorSiteTest(unittest.TestCase):
         self.assertTrue(len(resultC_1) == 510)
         self.assertTrue(resultC_1 == resultC_2)
 
-    @mock.patch('meme_get.memesites.requests.get',
-                side_effect=mock_requests_get)
-    def test_memes_on_page(self, mock_get):
+    @mock.patch('meme_get.download.get_session')
+    def test_memes_on_page(self, mock_session):
         """ Testing the _memes_on_page() function of the MemeGenerator class
         """
 
+        mock_session.return_value.get.side_effect = mock_requests_get
         A = memesites.MemeGenerator()
         # This the function call that will use the mock function
         A._memes_on_page(1, 10)
@@ -262,5 +1224,591 @@ class RedditMemeSiteTest(unittest.TestCase):
             print(a.get_title())
 
 
+class ThresholdTest(unittest.TestCase):
+    """ Test the OCR thresholding stage
+    """
+
+    def test_textmask(self):
+        """ Only bright and unsaturated pixels are caption text
+        """
+        im = Image.new("RGB", (5, 1))
+        im.putdata([(255, 255, 255), (240, 235, 238), (255, 200, 200),
+                    (200, 200, 200), (0, 0, 0)])
+        mask = threshold.textmask(im)
+        self.assertEqual(mask.shape, (1, 5))
+        self.assertEqual(mask.tolist(), [[True, True, False, False, False]])
+
+    def test_threshold(self):
+        """ Test the modes and inversion of the thresholded image
+        """
+        im = Image.new("RGB", (2, 1))
+        im.putdata([(255, 255, 255), (10, 20, 30)])
+
+        th = threshold.threshold(im)
+        self.assertEqual(th.mode, "L")
+        self.assertEqual(th.getpixel((0, 0)), 255)
+        self.assertEqual(th.getpixel((1, 0)), 0)
+
+        th = threshold.threshold(im, invert=True)
+        self.assertEqual(th.getpixel((0, 0)), 0)
+        self.assertEqual(th.getpixel((1, 0)), 255)
+
+        th = threshold.threshold(im, mode="1")
+        self.assertEqual(th.mode, "1")
+        self.assertTrue(th.getpixel((0, 0)))
+        self.assertFalse(th.getpixel((1, 0)))
+
+        self.assertRaises(ValueError, threshold.threshold, im, mode="RGB")
+
+
+class ComponentsTest(unittest.TestCase):
+    """ Test the connected component labeling
+    """
+
+    def test_label(self):
+        """ Components are 4-connected and numbered in row-major order
+        """
+        mask = np.array([[0, 1, 1, 0, 0],
+                         [0, 0, 1, 0, 1],
+                         [1, 0, 1, 1, 1],
+                         [0, 1, 0, 0, 0]], dtype=bool)
+        labels, comps = components.label(mask)
+
+        self.assertEqual(labels.tolist(), [[0, 1, 1, 0, 0],
+                                           [0, 0, 1, 0, 1],
+                                           [2, 0, 1, 1, 1],
+                                           [0, 3, 0, 0, 0]])
+        self.assertEqual([c.size for c in comps], [7, 1, 1])
+        self.assertEqual(comps[0].bounds, (1, 0, 4, 2))
+        self.assertEqual(comps[2].bounds, (1, 3, 1, 3))
+
+    def test_label_empty(self):
+        """ An empty mask has no components
+        """
+        labels, comps = components.label(np.zeros((3, 4), dtype=bool))
+        self.assertFalse(labels.any())
+        self.assertEqual(comps, [])
+
+
+class GlyphsTest(unittest.TestCase):
+    """ Test the glyph template cache
+    """
+
+    def test_templates(self):
+        """ Glyphs are rendered once and shared
+        """
+        A = glyphs.templates()
+        self.assertEqual(A.shape, (len(glyphs.C), 110, 100))
+        self.assertTrue(A is glyphs.templates())
+        self.assertFalse(A.flags.writeable)
+        # Every glyph starts at the first column
+        self.assertTrue(all(glyphs.firstwhitex(g) == 0 for g in A))
+
+    def test_template_file(self):
+        """ Glyphs can be saved to and loaded from a template file
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            A = glyphs.templates("AB", directory=directory)
+            path = glyphs.templatepath(directory, "AB")
+            self.assertTrue(os.path.isfile(path))
+            self.assertTrue(np.array_equal(np.load(path), A))
+            self.assertTrue(np.array_equal(A, glyphs.templates()[:2]))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_match(self):
+        """ Batched matching gives the per-pixel +1/-1 scores
+        """
+        rng = np.random.RandomState(0)
+        mask = rng.rand(80, 90) > 0.5
+        bounds = [(3, 4, 40, 60), (50, 30, 89, 79)]
+        G = glyphs.templates()[:3]
+        scores = glyphs.match(mask, bounds, G)
+        self.assertEqual(scores.shape, (2, 3))
+
+        for i, bd in enumerate(bounds):
+            for j in range(len(G)):
+                score = 0
+                sc = (bd[3] - bd[1]) / 100.0
+                for x in range(G.shape[2]):
+                    for y in range(G.shape[1]):
+                        xp = min(int(x * sc + bd[0]), mask.shape[1] - 1)
+                        yp = min(int(y * sc + bd[1]), mask.shape[0] - 1)
+                        if xp < bd[2]:
+                            score += 1 if G[j, y, x] == 255 * mask[yp, xp] \
+                                else -1
+                        elif G[j, y, x] != 0:
+                            score -= 1
+                self.assertEqual(scores[i, j], score)
+
+
+class WordListTest(unittest.TestCase):
+    """ Test the OCR word list
+    """
+
+    def test_load(self):
+        """ The word list is read once and shared
+        """
+        wl = wordlist.load()
+        self.assertTrue(wl is wordlist.load())
+        self.assertTrue("HELLO" in wl)
+        self.assertFalse("hello" in wl)
+        self.assertFalse("HELLOQX" in wl)
+
+    def test_prefix(self):
+        """ Prefix queries find the words starting with a prefix
+        """
+        wl = wordlist.WordList(["CAT", "CATS", "DOG", "CART"])
+        self.assertTrue(wl.has_prefix("CA"))
+        self.assertTrue(wl.has_prefix("DOG"))
+        self.assertFalse(wl.has_prefix("DOGS"))
+        self.assertFalse(wl.has_prefix("B"))
+        self.assertFalse(wl.has_prefix("Z"))
+        self.assertEqual(wl.with_prefix("CA"), ["CART", "CAT", "CATS"])
+        self.assertEqual(wl.with_prefix("E"), [])
+
+
+class ParseTest(unittest.TestCase):
+    """ Test guessing words from OCR scores
+    """
+
+    def setUp(self):
+        patcher = mock.patch.object(
+            wordlist, "_wordlist",
+            wordlist.WordList(["CAT", "COT", "CUT", "DOG", "OK"]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_choicerank(self):
+        """ Choices are ranked in util.allchoice order
+        """
+        groups = [["a", "b"], ["c"], ["d", "e", "f"]]
+        sizes = [len(g) for g in groups]
+        for i, c in enumerate(util.allchoice(groups)):
+            choice = dict((j, groups[j].index(x))
+                          for j in range(len(groups))
+                          for x in c if x in groups[j])
+            self.assertEqual(parse.choicerank(choice, sizes), i)
+
+    def test_guessword(self):
+        """ The best scoring changes that make a word are used
+        """
+        ccr = [[["C", 1.0], ["G", 0.9]],
+               [["A", 1.0], ["O", 0.95], ["U", 0.9]],
+               [["I", 1.0], ["T", 0.85]]]
+        self.assertEqual(parse.guessword([0, 1, 2], ccr), "CAT")
+        self.assertEqual(parse.guessword([0, 1, 2], ccr, simple=True),
+                         "CAI")
+        # Changes scoring below 0.8 are not tried
+        ccr[2][1][1] = 0.7
+        self.assertEqual(parse.guessword([0, 1, 2], ccr), "CAI")
+        # Characters that are not scored are kept
+        self.assertEqual(parse.guessword(["O", 0], [[["X", 1.0],
+                                                     ["K", 0.9]]]), "OK")
+
+    def test_guessformat(self):
+        """ Areas are grouped into lines of words and punctuation
+        """
+        bds = [[60, 100, 80, 140],  # second line
+               [0, 10, 20, 50], [22, 12, 42, 52], [80, 10, 100, 50],
+               [102, 11, 110, 30],  # half height: "?"
+               [0, 102, 20, 142], [22, 100, 42, 140]]
+        ccr = [[["T", 1.0]], [["C", 1.0]], [["A", 1.0]], [["O", 1.0]],
+               [["X", 1.0]], [["D", 1.0]], [["O", 1.0]]]
+        lines = parse.guessformat(bds, ccr)
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0].bounds, (0, 10, 110, 52))
+        self.assertEqual(lines[0].words, [parse.Word([1, 2], None),
+                                          parse.Word([3], None),
+                                          parse.Word([], "?")])
+        self.assertEqual(lines[1].words, [parse.Word([5, 6], None),
+                                          parse.Word([0], None)])
+        self.assertEqual(parse.guessline(lines[0], ccr), "CA O ?")
+        self.assertEqual(parse.guessline(lines[1], ccr), "DO T")
+
+    def test_budget(self):
+        """ The search gives up on long words past its budget
+        """
+        ccr = [[["C", 1.0], ["D", 0.95], ["O", 0.9], ["G", 0.85]]
+               for _ in range(30)]
+        start = time.time()
+        self.assertEqual(parse.guessword(list(range(30)), ccr), "C" * 30)
+        self.assertLess(time.time() - start, 10)
+        ccr = [[["D", 1.0]], [["A", 1.0], ["O", 0.9]], [["G", 1.0]]]
+        self.assertEqual(parse.guessword([0, 1, 2], ccr), "DOG")
+        self.assertEqual(parse.guessword([0, 1, 2], ccr, budget=2), "DAG")
+
+
+class OcrImageTest(unittest.TestCase):
+    """ Test sharing a decoded picture between OCR engines
+    """
+
+    def setUp(self):
+        im = Image.new("RGB", (120, 80))
+        for x in range(30, 60):
+            for y in range(10, 50):
+                im.putpixel((x, y), (255, 255, 255))
+        data = io.BytesIO()
+        im.save(data, "PNG")
+        self.data = data.getvalue()
+
+    def test_decode_once(self):
+        """ Engines decode and threshold a shared image once
+        """
+        backend = mock.Mock()
+        backend.ocr.side_effect = lambda im, cfg, sc: im.mode
+        engine = memeocr.OcrEngine(backend=backend)
+        image = memeocr.OcrImage(io.BytesIO(self.data))
+
+        with mock.patch.object(memeocr, "loadimg",
+                               wraps=memeocr.loadimg) as loadimg, \
+                mock.patch.object(memeocr, "thresh",
+                                  wraps=memeocr.thresh) as thresh:
+            threads = [threading.Thread(target=engine.tesseract,
+                                        args=(image, i % 2 == 0))
+                       for i in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(engine.tesseract(image, thres=True), "L")
+            self.assertEqual(engine.tesseract(image), "RGB")
+            engine.rawocr(image)
+        self.assertEqual(loadimg.call_count, 1)
+        self.assertEqual(thresh.call_count, 1)
+
+        image.close()
+        self.assertRaises(ValueError, image.image)
+
+    def test_owned_image(self):
+        """ Engines close the images they open themselves
+        """
+        backend = mock.Mock()
+        backend.ocr.side_effect = lambda im, cfg, sc: im.size
+        engine = memeocr.OcrEngine(backend=backend)
+        self.assertEqual(engine.tesseract(io.BytesIO(self.data)), (120, 80))
+        with mock.patch.object(memeocr.OcrImage, "close") as close:
+            engine.tesseract(io.BytesIO(self.data))
+        self.assertEqual(close.call_count, 1)
+
+
+class PreprocessTest(unittest.TestCase):
+    """ Test scaling pictures down and cropping them to their captions
+    """
+
+    def setUp(self):
+        # 1200 rows with a 96 row caption line at the top and the bottom
+        self.image = Image.new("RGB", (800, 1200), (40, 90, 160))
+        for y0 in [50, 1000]:
+            for x0 in range(100, 700, 60):
+                self.image.paste((255, 255, 255), (x0, y0, x0 + 40, y0 + 96))
+
+    def test_textlines(self):
+        """ Caption lines are found from the rows of text pixels
+        """
+        lines = preprocess.textlines(self.image)
+        self.assertEqual(len(lines), 2)
+        for (a, b), y0 in zip(lines, [50, 1000]):
+            self.assertTrue(abs(a - y0) <= 3 and abs(b - y0 - 96) <= 3)
+
+    def test_apply(self):
+        """ Pictures are cropped to their captions and scaled down
+        """
+        image, cropped = preprocess.DEFAULT.apply(self.image)
+        self.assertTrue(cropped)
+        self.assertEqual(image.size[0], 800 // 2)
+        self.assertLess(image.size[1], 250)
+        # both lines are kept, at about the target height
+        rows = threshold.textmask(image).any(axis=1)
+        self.assertEqual(int(np.diff(rows.astype(int)).clip(0).sum()), 2)
+        self.assertTrue(abs(rows.sum() - 2 * preprocess.TEXT_HEIGHT) <= 4)
+
+        image, cropped = preprocess.Preprocess(crop=False).apply(self.image)
+        self.assertFalse(cropped)
+        self.assertEqual(image.size, (400, 600))
+
+        image, cropped = preprocess.Preprocess(detect=False,
+                                               text_height=None).apply(
+                                                   self.image)
+        self.assertTrue(cropped)
+        self.assertEqual(image.size, (800, 600 + 4))
+
+    def test_small(self):
+        """ Small pictures are used as they are
+        """
+        small = self.image.resize((400, 500))
+        self.assertTrue(preprocess.DEFAULT.apply(small)[0] is small)
+
+    def test_ocr_image(self):
+        """ Every layer is derived from the preprocessed picture
+        """
+        data = io.BytesIO()
+        self.image.save(data, "PNG")
+        data = data.getvalue()
+        image = memeocr.OcrImage(io.BytesIO(data), preprocess.DEFAULT)
+        self.assertEqual(image.image().size[0], 400)
+        self.assertTrue(image.cropped)
+        self.assertEqual(image.threshold().size, image.image().size)
+        self.assertEqual(image.mask().shape[1], 400)
+        image.close()
+
+        # Without settings the picture is read as it is
+        image = memeocr.OcrImage(io.BytesIO(data))
+        self.assertEqual(image.image().size, (800, 1200))
+        self.assertFalse(image.cropped)
+        image.close()
+
+    def test_tesseract_input(self):
+        """ Tesseract reads the preprocessed picture
+        """
+        data = io.BytesIO()
+        self.image.save(data, "PNG")
+        data = data.getvalue()
+        backend = mock.Mock()
+        backend.ocr.return_value = "TOP TEXT"
+        engine = memeocr.OcrEngine(backend=backend)
+        self.assertEqual(engine.tesseract(io.BytesIO(data), thres=True),
+                         "TOP TEXT")
+        self.assertEqual(backend.ocr.call_args[0][0].size[0], 400)
+
+        engine = memeocr.OcrEngine(backend=backend, preprocess=None)
+        engine.tesseract(io.BytesIO(data))
+        self.assertEqual(backend.ocr.call_args[0][0].size, (800, 1200))
+
+    def test_header(self):
+        """ A blank band is not a caption line and does not shrink text
+        """
+        # A white header above a picture with text in the middle
+        image = Image.new("RGB", (800, 1200), (40, 90, 160))
+        image.paste((255, 255, 255), (0, 0, 800, 240))
+        for x0 in range(100, 700, 60):
+            image.paste((255, 255, 255), (x0, 600, x0 + 40, 640))
+        self.assertEqual(preprocess.textlines(image), [])
+
+        # Even tall lines are not shrunk more than max_shrink
+        tall = Image.new("RGB", (800, 1200), (40, 90, 160))
+        for x0 in range(100, 700, 60):
+            tall.paste((255, 255, 255), (x0, 20, x0 + 40, 190))
+        self.assertEqual(len(preprocess.textlines(tall)), 1)
+        out, cropped = preprocess.Preprocess(text_height=16).apply(tall)
+        self.assertEqual(out.size[0], 800 // preprocess.MAX_SHRINK)
+
+
+class OcrEngineTest(unittest.TestCase):
+    """ Test FontMatching OCR on a sample picture
+    """
+
+    SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          os.pardir, "docs", "source", "images", "meme0.jpg")
+
+    def test_quiet(self):
+        """ By default OCR prints nothing and draws nothing
+        """
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), \
+                mock.patch.object(memeocr.ImageDraw, "Draw") as Draw:
+            result = memeocr.OcrEngine().rawocr(self.SAMPLE)
+            result.caption()
+        self.assertEqual(out.getvalue(), "")
+        self.assertEqual(Draw.call_count, 0)
+        self.assertIsNone(result.display)
+        self.assertTrue(len(result.bounds) > 0)
+
+    def test_debug(self):
+        """ In debug mode the areas are drawn on the display layer
+        """
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            debug = memeocr.OcrEngine(debug=True).rawocr(self.SAMPLE)
+        self.assertTrue("Finish OCR." in out.getvalue())
+        self.assertEqual(debug.display.size,
+                         Image.open(self.SAMPLE).size)
+        self.assertTrue(debug.display.getbbox() is not None)
+
+        result = memeocr.OcrEngine().rawocr(self.SAMPLE)
+        self.assertEqual(result.bounds, debug.bounds)
+        self.assertEqual(result.scoreboard, debug.scoreboard)
+
+
+class OcrCompTest(unittest.TestCase):
+    """ Test choosing between OCR results
+    """
+
+    def setUp(self):
+        patcher = mock.patch.object(
+            wordlist, "_wordlist",
+            wordlist.WordList(["ONE", "DOES", "NOT", "SIMPLY"]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ocrcomp(self):
+        """ Results are sorted best first and scored once
+        """
+        f = lambda p: "ONE DOES NOT"
+        g = lambda p: "ONE DOES NQT"
+        with mock.patch.object(ocrcomp, "evalresult",
+                               wraps=ocrcomp.evalresult) as evalresult:
+            self.assertEqual(ocrcomp.ocrcomp("x", g, f),
+                             [(f, "ONE DOES NOT"), (g, "ONE DOES NQT")])
+        self.assertEqual(evalresult.call_count, 2)
+
+    def test_best(self):
+        """ The best result wins, ties go to the earlier candidate
+        """
+        result = ocrcomp.best("x", [("a", lambda p: "0NE DOES"),
+                                    ("b", lambda p: "ONE DOES"),
+                                    ("c", lambda p: "ONE DOES")],
+                              threshold=None)
+        self.assertEqual((result.name, result.caption, result.score),
+                         ("b", "ONE DOES", 1.0))
+        self.assertTrue(result.seconds >= 0)
+
+    def test_early_exit(self):
+        """ A good enough result does not wait for slow candidates
+        """
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def slow(p):
+            release.wait(10)
+            return "ONE DOES NOT SIMPLY"
+
+        closed = threading.Event()
+        start = time.time()
+        result = ocrcomp.best("x", [("slow", slow),
+                                    ("fast", lambda p: "ONE DOES NOT")],
+                              release=closed.set)
+        self.assertEqual(result.name, "fast")
+        self.assertLess(time.time() - start, 5)
+
+        # The shared picture is only released once slow is done with it
+        self.assertFalse(closed.is_set())
+        release.set()
+        self.assertTrue(closed.wait(5))
+
+    def test_errors(self):
+        """ Failed candidates are skipped unless all of them fail
+        """
+        def fail(p):
+            raise IOError("broken")
+
+        result = ocrcomp.best("x", [("a", fail), ("b", lambda p: "NOT")])
+        self.assertEqual(result.name, "b")
+        self.assertRaises(IOError, ocrcomp.best, "x", [("a", fail)])
+
+        closed = []
+        self.assertRaises(IOError, ocrcomp.best, "x", [("a", fail)],
+                          release=lambda: closed.append(True))
+        self.assertEqual(closed, [True])
+
+    def test_file_object(self):
+        """ Every candidate reads the whole picture
+        """
+        image = io.BytesIO(b"ONE")
+        image.read()
+        result = ocrcomp.best(image, [(str(i), lambda p: p.read().decode())
+                                      for i in range(4)], threshold=None)
+        self.assertEqual(result.caption, "ONE")
+
+
+class TesseractTest(unittest.TestCase):
+    """ Test the Tesseract backend with fake pyocr and enchant modules
+    """
+
+    def setUp(self):
+        self.tool = mock.Mock()
+        self.tool.get_name.return_value = "Fake"
+        self.tool.get_available_languages.return_value = ["eng"]
+        self.tool.image_to_string.return_value = "HELO WORLD\nHELO"
+        pyocr = mock.Mock()
+        pyocr.get_available_tools.return_value = [self.tool]
+
+        self.dict = mock.Mock()
+        self.dict.check.side_effect = lambda w: w != "HELO"
+        self.dict.suggest.side_effect = lambda w: ["HELLO", "HALO"]
+        enchant = mock.Mock()
+        enchant.DictWithPWL.return_value = self.dict
+
+        patcher = mock.patch.dict(sys.modules, {
+            "pyocr": pyocr, "pyocr.builders": pyocr.builders,
+            "enchant": enchant})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pyocr = pyocr
+        self.enchant = enchant
+
+    def test_setup_once(self):
+        """ The tool and dictionary are set up once per backend
+        """
+        backend = tesseract.TesseractBackend()
+        for _ in range(3):
+            self.assertEqual(backend.ocr(None), "HELLO WORLD \n HELLO")
+        self.assertEqual(self.pyocr.get_available_tools.call_count, 1)
+        self.assertEqual(self.enchant.DictWithPWL.call_count, 1)
+        # Suggestions are memoized
+        self.assertEqual(self.dict.suggest.call_count, 1)
+
+    def test_no_spellcheck(self):
+        """ Spell-correction is a separate, optional stage
+        """
+        backend = tesseract.TesseractBackend()
+        self.assertEqual(backend.ocr(None, spellcheck=False),
+                         "HELO WORLD\nHELO")
+        self.assertEqual(self.enchant.DictWithPWL.call_count, 0)
+        self.assertEqual(backend.correct("HELO  WORLD"), "HELLO  WORLD")
+
+    def test_cache_size(self):
+        """ The memoized corrections are bounded
+        """
+        backend = tesseract.TesseractBackend(cache_size=2)
+        for w in ["A", "B", "C", "A"]:
+            backend.correct_word(w)
+        self.assertEqual(self.dict.check.call_count, 4)
+        backend.correct_word("A")
+        self.assertEqual(self.dict.check.call_count, 4)
+
+    def test_no_tool(self):
+        """ A missing OCR tool raises an error
+        """
+        self.pyocr.get_available_tools.return_value = []
+        self.assertRaises(RuntimeError, tesseract.TesseractBackend().tool)
+
+
+class StartupTest(unittest.TestCase):
+    """ Test that importing meme_get stays cheap
+    """
+
+    # Modules that must only be loaded when they are first used
+    LAZY = ["bs4", "praw", "configparser", "enchant", "pyocr", "numpy",
+            "PIL", "meme_get.ocr.ocrcomp", "meme_get.ocr.memeocr",
+            "meme_get.ocr.parse"]
+
+    def test_lazy_imports(self):
+        """ Importing memesites does not load OCR or site dependencies
+        """
+        code = ("import sys, json, meme_get.memesites; "
+                "print(json.dumps(sorted(sys.modules)))")
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            os.pardir)
+        out = subprocess.check_output([sys.executable, "-c", code],
+                                      cwd=root)
+        loaded = set(json.loads(out.decode("utf-8")))
+        self.assertEqual([m for m in self.LAZY if m in loaded], [])
+
+    def test_word_list(self):
+        """ The OCR word list is not read at import
+        """
+        code = ("import meme_get.memesites, meme_get.ocr.parse, "
+                "meme_get.ocr.ocrcomp; "
+                "from meme_get.ocr import wordlist; "
+                "print(wordlist._wordlist is None)")
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            os.pardir)
+        out = subprocess.check_output([sys.executable, "-c", code],
+                                      cwd=root)
+        self.assertEqual(out.decode("utf-8").strip(), "True")
+
+
 if __name__ == '__main__':
     unittest.main()